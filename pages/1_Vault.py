@@ -1,6 +1,5 @@
 # pages/1_Vault.py
-from datetime import datetime, timedelta
-from decimal import Decimal, getcontext
+from datetime import date, timedelta
 
 import pandas as pd
 import pytz
@@ -8,15 +7,20 @@ import streamlit as st
 import altair as alt
 
 from src.auth import guard_other_pages, logout_button
-from src.chain import get_w3, checksum, find_block_at_or_before_timestamp
-from src.erc4626 import read_vault_snapshot
-from src.fees import get_fee_amount_for_day
-from src.events import get_deposits_withdraws  # <-- NEW
-from src.storage import load_csv, save_csv, append_or_update_today, latest_date
-from src.app_config import START_DATE, SNAPSHOT_LOCAL_TIME, VAULTS
+from src.chain import get_w3, checksum
+from src.collect import collect_vault, flight_key, page_backfill_enabled, vault_missing_days
+from src.live_progress import live_progress
+from src.single_flight import run_in_background
+from src.storage import load_vault, vault_date_range, vault_summaries, vault_yield_before
+from src.analytics import SUMMARY_COLUMNS, summarize, summary_apy, vault_metrics
+from src.downsample import downsample
+from src.app_config import START_DATE, VAULTS
 
-getcontext().prec = 50
 TZ = pytz.timezone("Europe/Amsterdam")
+# Days read before the end of the history for the 7d / 30d APYs
+TRAILING_DAYS = 60
+# Days read before a zoomed range, so its first day has a return
+ZOOM_LEAD_DAYS = 7
 
 st.set_page_config(page_title="Vault Data", page_icon=None, layout="wide")
 
@@ -86,168 +90,86 @@ logout_button()
 st.header(f"{active_vault['name']}")
 st.caption(f"Address: `{active_vault['address']}`  ·  Start date: {START_DATE}")
 
-# ------- Web3 -------
-try:
-    w3 = get_w3()
-except Exception as e:
-    st.error(f"Web3 error: {e}")
-    st.stop()
-
 try:
     vault_addr = checksum(active_vault["address"])
 except Exception as e:
     st.error(f"Invalid address for {active_vault['name']}: {e}")
     st.stop()
 
-# ------- CSV load & compute missing days only -------
-df = load_csv(vault_addr)
-
-today_local = datetime.now(TZ).date()
-start_dt = datetime.strptime(START_DATE, "%Y-%m-%d").date()
-
-last = latest_date(df)
-if last:
-    try:
-        last_dt = datetime.strptime(last, "%Y-%m-%d").date()
-        begin = max(start_dt, last_dt + timedelta(days=1))
-    except Exception:
-        begin = start_dt
-else:
-    begin = start_dt
-
-# Incrementally append ONLY missing days (do not touch existing rows)
-if begin <= today_local:
-    days = (today_local - begin).days + 1
-    progress = st.progress(0.0, text="Updating CSV…")
-    for i in range(days):
-        d = begin + timedelta(days=i)
-        date_str = d.strftime("%Y-%m-%d")
-
-        # Day window (local) for fees+events and snapshot time
-        sod_local = datetime(d.year, d.month, d.day, tzinfo=TZ)
-        eod_local = sod_local + timedelta(days=1, seconds=-1)
-        since_ts = int(sod_local.astimezone(pytz.UTC).timestamp())
-        until_ts = int(eod_local.astimezone(pytz.UTC).timestamp())
-
-        snap_local = datetime.combine(d, SNAPSHOT_LOCAL_TIME, tzinfo=TZ)
-        snap_ts = int(snap_local.astimezone(pytz.UTC).timestamp())
-
-        # Block at snapshot
-        try:
-            block_id = find_block_at_or_before_timestamp(w3, snap_ts)
-        except Exception as e:
-            st.warning(f"{date_str}: failed to map timestamp to block → {e}")
-            continue
-
-        # Snapshot read
-        try:
-            snap = read_vault_snapshot(w3, vault_addr, block_identifier=block_id)
-        except Exception as e:
-            st.warning(f"{date_str}: snapshot failed at block {block_id} → {e}")
-            continue
-
-        asset_symbol = snap.get("asset_symbol") or "ASSET"
-        total_assets = snap["total_assets"]
-        share_price  = snap["share_price"]
-        total_supply = snap["total_supply"]
-
-        # --- Fees over the calendar day
-        fee_amount = get_fee_amount_for_day(
-            w3=w3, vault_addr=vault_addr, since_ts=since_ts, until_ts=until_ts
-        )
-
-        # --- NEW: Deposits & Withdraws over the calendar day
-
-        deposits, withdraws = get_deposits_withdraws(
-                w3=w3, vault_addr=vault_addr, since_ts=since_ts, until_ts=until_ts
-            )
-
-        # Compute APY / yield vs previous stored row
-        apy = Decimal(0)
-        yield_earned = Decimal(0)
-        if not df.empty and (df["date"] < date_str).any():
-            prev = df.sort_values("date")[df["date"] < date_str].iloc[-1]
-            prev_sp = Decimal(str(prev["share_price"])) if pd.notna(prev["share_price"]) else Decimal(0)
-            if prev_sp > 0 and share_price > 0:
-                daily_ret = (share_price - prev_sp) / prev_sp
-                apy = (Decimal(1) + daily_ret) ** Decimal(365) - Decimal(1)
-                yield_earned = (share_price - prev_sp) * total_supply
-
-        # Append the new day
-        df = append_or_update_today(
-            df,
-            date_str=date_str,
-            total_assets=total_assets,
-            share_price=share_price,
-            fee_amount=fee_amount,
-            apy=apy,
-            yield_earned=yield_earned,
-            asset_symbol=asset_symbol,
-            vault_address=vault_addr,
-            markets=active_vault.get("markets", []),
-            deposits=deposits,
-            withdraws=withdraws
-        )
-
-        save_csv(vault_addr, df)
-        progress.progress((i + 1) / days, text=f"Updating CSV… {date_str} (block {block_id})")
-    progress.empty()
-
-# ------- Helpers -------
-def _to_dec(x, default=Decimal(0)):
-    try:
-        return Decimal(str(x))
-    except Exception:
-        return default
+# ------- Missing days (collected by scripts/collect_daily.py) -------
+# With PAGE_BACKFILL=1 a background worker collects them; the page draws
+# from the stored rows right away and reruns once the new rows have landed.
+job_key = flight_key("vault", vault_addr)
+missing = vault_missing_days(vault_addr)
+if missing and page_backfill_enabled():
+    run_in_background(job_key, lambda: collect_vault(get_w3(), active_vault), min_interval=300)
+job = live_progress(job_key, "Updating data…")
+if not job["running"] and job["result"]:
+    for date_str, err in sorted(job["result"][1].items()):
+        st.warning(f"{date_str}: {err}")
+
+# ------- Stored rows -------
+first_date, last_date = vault_date_range(vault_addr)
+if missing and last_date and not job["running"]:
+    st.caption(f"Data up to {last_date} · {len(missing)} day(s) not collected yet (`python scripts/collect_daily.py`).")
+
+df = pd.DataFrame()  # the selected date range's rows (table)
 
 # ------- SUMMARY -------
-if df.empty:
-    st.info("No data yet. Check your START_DATE and RPC; the app will populate incrementally.")
+if first_date is None:
+    st.info("No data yet. Run `python scripts/collect_daily.py` (or set PAGE_BACKFILL=1) to collect it.")
 else:
-    df_sorted = df.sort_values("date").reset_index(drop=True)
-
-    sp_series = pd.to_numeric(df_sorted["share_price"], errors="coerce").dropna()
-    if len(sp_series) >= 2:
-        sp0 = Decimal(str(sp_series.iloc[0]))
-        spN = Decimal(str(sp_series.iloc[-1]))
-    else:
-        sp0 = Decimal(0); spN = Decimal(0)
-
-    first_date = pd.to_datetime(df_sorted["date"].iloc[0]).date()
-    last_date  = pd.to_datetime(df_sorted["date"].iloc[-1]).date()
-    elapsed_days = (last_date - first_date).days
-
-    if sp0 > 0 and elapsed_days > 0:
-        total_ratio = (spN / sp0)
-        ann_apy = (total_ratio ** (Decimal(365) / Decimal(elapsed_days))) - Decimal(1)
-        ann_apy_pct = ann_apy * 100
-    else:
-        ann_apy_pct = Decimal(0)
-
-    total_yield_cum = df_sorted["yield_earned"].apply(_to_dec).sum()
-    latest_row = df_sorted.iloc[-1]
-    latest_assets = _to_dec(latest_row["total_assets"])
-    latest_sp = _to_dec(latest_row["share_price"])
-    asset_symbol = latest_row.get("asset_symbol", "")
-
-    c1, c2, c3, c4 = st.columns(4)
+    # headline numbers from the stored summary; trailing APYs from the last weeks only
+    record = vault_summaries().get(vault_addr.lower()) or {}
+    tail_since = (date.fromisoformat(last_date) - timedelta(days=TRAILING_DAYS)).isoformat()
+    trailing = summarize(load_vault(vault_addr, columns=SUMMARY_COLUMNS, since=tail_since))
+    ann_apy_pct = summary_apy(record) * 100
+    total_yield_cum = float(record.get("total_yield") or 0.0)
+    latest_assets = float(record.get("total_assets") or 0.0)
+    latest_sp = float(record.get("share_price") or 0.0)
+    asset_symbol = record.get("asset_symbol") or ""
+
+    c1, c2, c3, c4, c5 = st.columns(5)
     with c1:
         st.markdown(f'<div class="summary-card"><h4>Annualized APY (since start)</h4><div class="val">{ann_apy_pct:.2f}%</div></div>', unsafe_allow_html=True)
     with c2:
-        st.markdown(f'<div class="summary-card"><h4>Total Yield</h4><div class="val">{total_yield_cum:,.2f} {asset_symbol}</div></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="summary-card"><h4>APY 7d · 30d</h4><div class="val">{trailing["apy_7d"] * 100:.2f}% · {trailing["apy_30d"] * 100:.2f}%</div></div>', unsafe_allow_html=True)
     with c3:
-        st.markdown(f'<div class="summary-card"><h4>Latest Total Assets</h4><div class="val">{latest_assets:,.2f} {asset_symbol}</div></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="summary-card"><h4>Total Yield</h4><div class="val">{total_yield_cum:,.2f} {asset_symbol}</div></div>', unsafe_allow_html=True)
     with c4:
+        st.markdown(f'<div class="summary-card"><h4>Latest Total Assets</h4><div class="val">{latest_assets:,.2f} {asset_symbol}</div></div>', unsafe_allow_html=True)
+    with c5:
         st.markdown(f'<div class="summary-card"><h4>Latest Share Price</h4><div class="val">{latest_sp:.4f}</div></div>', unsafe_allow_html=True)
 
     # ------- CHARTS -------
     st.subheader("Charts")
-    df_plot = df_sorted.copy()
+    # Zoom: only the selected range is read from the database (plus a few
+    # days before it, so its first day has a return); charts thin it (LTTB)
+    # to CHART_WIDTH_PX points per series, the table shows all of it.
+    first_day, last_day = date.fromisoformat(first_date), date.fromisoformat(last_date)
+    zoom = (first_day, last_day)
+    if first_day < last_day:
+        zoom = st.slider("Date range", min_value=first_day, max_value=last_day,
+                         value=(first_day, last_day), format="DD-MM-YYYY", key=f"zoom-{slug}")
+    since, until = zoom[0].isoformat(), zoom[1].isoformat()
+    lead = (zoom[0] - timedelta(days=ZOOM_LEAD_DAYS)).isoformat()
+    df_read = load_vault(vault_addr, since=lead, until=until)
+    df_plot = vault_metrics(df_read)
+    # stored yield_earned, the quantity vault_summaries()' total_yield sums, so the last point matches the card
+    stored_yield = pd.to_numeric(df_read["yield_earned"], errors="coerce").fillna(0.0)
+    df_plot["cum_yield"] = vault_yield_before(vault_addr, lead) + stored_yield.cumsum().to_numpy()
+    df_plot = df_plot[df_plot["date"] >= since].reset_index(drop=True)
+    df = df_read[df_read["date"] >= since]
+
     df_plot["Date"] = pd.to_datetime(df_plot["date"])
-    df_plot["cum_yield"] = pd.to_numeric(df_plot["yield_earned"], errors="coerce").fillna(0.0).cumsum().astype(float)
-    df_plot["daily_apy_pct"] = (pd.to_numeric(df_plot["apy"], errors="coerce").fillna(0.0) * 100.0).astype(float)
+    df_plot["daily_apy_pct"] = df_plot["apy"] * 100.0
     df_plot["total_assets_float"] = pd.to_numeric(df_plot["total_assets"], errors="coerce").astype(float)
 
+    n_range = len(df_plot)
+    df_plot = downsample(df_plot, "Date", ["total_assets_float", "cum_yield", "daily_apy_pct"])
+    if len(df_plot) < n_range:
+        st.caption(f"Showing {len(df_plot):,} of {n_range:,} days; narrow the date range for full resolution.")
+
     chart_assets = (
         alt.Chart(df_plot)
         .mark_line()
@@ -286,20 +208,34 @@ else:
 # ------- TABLE -------
 st.subheader("Daily metrics")
 if not df.empty:
+    st.caption(f"{len(df):,} day(s) in the selected date range.")
+    # typed columns (formatted by the browser, so they also sort as numbers / dates)
     df_disp = df.sort_values("date", ascending=False).reset_index(drop=True)
-    df_view = pd.DataFrame()
-    df_view["Date"]          = pd.to_datetime(df_disp["date"]).dt.strftime("%d-%m-%Y")
-    df_view["Total Assets"]  = df_disp.apply(lambda r: f"{_to_dec(r['total_assets']):,.2f}", axis=1)
-    df_view["Share Price"]   = df_disp.apply(lambda r: f"{_to_dec(r['share_price']):.4f}", axis=1)
-    df_view["Fee"]           = df_disp.apply(lambda r: f"{_to_dec(r['fee_amount']):.2f}", axis=1)
-    df_view["APY"]           = df_disp.apply(lambda r: f"{(_to_dec(r['apy']) * 100):.2f}", axis=1)
-    df_view["Yield Earned"]  = df_disp.apply(lambda r: f"{_to_dec(r['yield_earned']):,.2f}", axis=1)
-
-    st.dataframe(df_view, use_container_width=True, hide_index=True)
+    df_view = pd.DataFrame({
+        "Date":         pd.to_datetime(df_disp["date"], format="%Y-%m-%d"),
+        "Total Assets": df_disp["total_assets"],
+        "Share Price":  df_disp["share_price"],
+        "Fee":          df_disp["fee_amount"],
+        "APY":          df_disp["apy"] * 100,
+        "Yield Earned": df_disp["yield_earned"],
+    })
+
+    st.dataframe(
+        df_view, use_container_width=True, hide_index=True,
+        column_config={
+            "Date":         st.column_config.DateColumn(format="DD-MM-YYYY"),
+            "Total Assets": st.column_config.NumberColumn(format="localized", step=0.01),
+            "Share Price":  st.column_config.NumberColumn(format="%.4f"),
+            "Fee":          st.column_config.NumberColumn(format="%.2f"),
+            "APY":          st.column_config.NumberColumn(format="%.2f"),
+            "Yield Earned": st.column_config.NumberColumn(format="localized", step=0.01),
+        },
+    )
 
 st.markdown(
-    '<p class="small-note">CSV is stored per-vault in <code>data/</code>. '
-    'This page appends only missing dates using the daily snapshot block. '
-    'Deposits/withdraws are scanned from ERC-4626 events each day.</p>',
+    '<p class="small-note">Rows are stored in the local database (<code>data/vaultage.db</code>) '
+    'and exported to <code>data/vault_&lt;addr&gt;.csv</code>. '
+    'Rows are collected by <code>scripts/collect_daily.py</code> at the daily snapshot block; '
+    'deposits/withdraws are scanned from ERC-4626 events each day.</p>',
     unsafe_allow_html=True
 )
\ No newline at end of file
@@ -1,20 +1,23 @@
 # pages/3_Comparisons.py
-from datetime import datetime, date, timedelta, time as dtime
-from decimal import Decimal, getcontext
-import os
+from datetime import date
+from decimal import getcontext
 
 import pandas as pd
 import pytz
 import streamlit as st
 import altair as alt
-from web3 import Web3
 
 from src.auth import guard_other_pages, logout_button
-from src.chain import get_w3, checksum, find_block_at_or_before_timestamp
-from src.erc4626 import read_vault_snapshot
+from src.chain import get_w3
+from src.collect import collect_comparisons, flight_key, page_backfill_enabled
+from src.downsample import downsample
+from src.live_progress import live_progress
+from src.single_flight import run_in_background
+from src.storage import comparison_date_range, load_comparisons
 
 # Import your app-wide vault list for sidebar navigation (keeps menu consistent)
-from src.app_config import VAULTS as APP_VAULTS
+# Comparison vaults and start date: COMPARISON_VAULTS / COMPARISON_START_DATE
+from src.app_config import COMPARISON_START_DATE, VAULTS as APP_VAULTS
 
 guard_other_pages()
 getcontext().prec = 50
@@ -22,27 +25,6 @@ TZ = pytz.timezone("Europe/Amsterdam")
 
 st.set_page_config(page_title="Comparisons — APYs", page_icon=None, layout="wide")
 
-# ----------------------------
-# Configure here (standalone for comparisons data)
-# ----------------------------
-COMPARISON_START_DATE = date(2025, 9, 1)          # inclusive
-SNAPSHOT_LOCAL_TIME   = dtime(12, 0, 0)           # daily snapshot time (Europe/Amsterdam)
-COMPARISON_CSV_PATH   = os.path.join("data", "apy_comparisons.csv")
-
-# Standalone list for which vaults to compare (can differ from APP_VAULTS)
-VAULTS = [
-    {"name": "kpk USDC Prime",      "address": "0xe108fbc04852B5df72f9E44d7C29F47e7A993aDd", "note": "USDC"},
-    {"name": "kpk WETH Yield",      "address": "0x234E5AE16eDf321AB5c2DDeBb0CCdf05aACb233b", "note": "WETH"},
-    {"name": "kpk EURC Yield",      "address": "0x0c6aec603d48eBf1cECc7b247a2c3DA08b398DC1", "note": "EURC"},
-    {"name": "Steakhouse USDC",     "address": "0xBEEF01735c132Ada46AA9aA4c54623cAA92A64CB", "note": "USDC"},
-    {"name": "Gauntlet USDC Prime", "address": "0xdd0f28e19C1780eb6396170735D45153D261490d", "note": "USDC"},
-    {"name": "Smokehouse USDC",     "address": "0xBEeFFF209270748ddd194831b3fa287a5386f5bC", "note": "USDC"},
-    {"name": "Steakhouse WETH",     "address": "0xBEEf050ecd6a16c4e7bfFbB52Ebba7846C4b8cD4", "note": "WETH"},
-    {"name": "Gauntlet WETH Prime", "address": "0x2371e134e3455e0593363cBF89d3b6cf53740618", "note": "WETH"},
-    {"name": "MEV Capital wETH",     "address": "0x9a8bC3B04b7f3D87cfC09ba407dCED575f2d61D8", "note": "WETH"},
-    {"name": "Gauntlet EURC Core",  "address": "0x2ed10624315b74a78f11FAbedAa1A228c198aEfB", "note": "EURC"},
-]
-
 # ----------------------------
 # Styling
 # ----------------------------
@@ -112,157 +94,34 @@ st.sidebar.divider()
 logout_button()
 
 # ----------------------------
-# Helpers
-# ----------------------------
-def _to_dec(x, default=Decimal(0)) -> Decimal:
-    try:
-        return Decimal(str(x))
-    except Exception:
-        return default
-
-def _underlying_from(name: str, asset_symbol: str | None) -> str:
-    s = (asset_symbol or "").strip()
-    if s:
-        return s.upper()
-    nm = (name or "").lower()
-    if "usdc" in nm: return "USDC"
-    if "usdt" in nm: return "WETH"
-    if "eurc" in nm: return "EURC"
-    return ""
-
-def _load_comparisons_csv() -> pd.DataFrame:
-    os.makedirs("data", exist_ok=True)
-    if os.path.exists(COMPARISON_CSV_PATH):
-        try:
-            return pd.read_csv(COMPARISON_CSV_PATH)
-        except Exception:
-            pass
-    return pd.DataFrame(columns=["date","vault_name","vault_address","underlying_token","daily_apy_pct"])
-
-def _save_comparisons_csv(df: pd.DataFrame) -> None:
-    tmp = COMPARISON_CSV_PATH + ".tmp"
-    df.to_csv(tmp, index=False)
-    os.replace(tmp, COMPARISON_CSV_PATH)
-
-def _snapshot_ts_for_day(d: date) -> int:
-    snap_local = datetime.combine(d, SNAPSHOT_LOCAL_TIME, tzinfo=TZ)
-    return int(snap_local.astimezone(pytz.UTC).timestamp())
-
-# ----------------------------
-# Chain connection
+# Stored APYs (collected by scripts/collect_daily.py, see src/collect.py)
 # ----------------------------
 st.header("Comparisons — Daily APYs")
-st.caption(f"Start date: {COMPARISON_START_DATE.isoformat()}. Builds and maintains `data/apy_comparisons.csv` by querying vaults on-chain.")
-
-try:
-    w3 = get_w3()
-except Exception as e:
-    st.error(f"Web3 error: {e}")
+st.caption(f"Start date: {COMPARISON_START_DATE}. Reads the `apy_comparisons` table (exported to `data/apy_comparisons.csv`), built by querying vaults on-chain.")
+
+# With PAGE_BACKFILL=1 a background worker collects missing days; the page
+# draws from the stored rows meanwhile and reruns when they have landed.
+job_key = flight_key("comparisons")
+if page_backfill_enabled():
+    run_in_background(job_key, lambda: collect_comparisons(get_w3()), min_interval=300)
+live_progress(job_key, "Reading snapshots…")
+
+first_date, last_date = comparison_date_range()
+if first_date is None:
+    st.info("No APY data yet. Run `python scripts/collect_daily.py` (or set PAGE_BACKFILL=1) to collect it.")
     st.stop()
 
-df_comp = _load_comparisons_csv()
-
-# Track existing (date, vault_address) rows to avoid duplicates
-existing_keys = set()
-if not df_comp.empty:
-    for _, r in df_comp[["date", "vault_address"]].dropna().iterrows():
-        existing_keys.add((str(r["date"]), str(r["vault_address"]).lower()))
-
-today_local = datetime.now(TZ).date()
-
-# ----------------------------
-# Incremental build (direct from chain)
-# ----------------------------
-progress = st.progress(0.0, text="Updating APYs…")
-
-total_tasks = len(VAULTS)
-done = 0
-
-for v in VAULTS:
-    name = v["name"]
-    addr = checksum(v["address"])
-    # Determine range to compute for this vault (based on what's already in CSV)
-    df_v_existing = df_comp[df_comp["vault_address"].str.lower() == addr.lower()]
-    if df_v_existing.empty:
-        begin = COMPARISON_START_DATE
-    else:
-        try:
-            last_str = str(df_v_existing["date"].max())
-            last_dt  = pd.to_datetime(last_str).date()
-            begin    = max(COMPARISON_START_DATE, last_dt + timedelta(days=1))
-        except Exception:
-            begin = COMPARISON_START_DATE
-
-    if begin > today_local:
-        done += 1
-        progress.progress(done / total_tasks, text=f"{name}: up to date")
-        continue
-
-    # Fetch sequentially so we can reuse yesterday's share price
-    prev_day = begin - timedelta(days=1)
-    prev_sp  = None
-    try:
-        ts_prev  = _snapshot_ts_for_day(prev_day)
-        block_prev = find_block_at_or_before_timestamp(w3, ts_prev)
-        snap_prev  = read_vault_snapshot(w3, addr, block_identifier=block_prev)
-        if snap_prev and snap_prev.get("share_price"):
-            prev_sp = _to_dec(snap_prev["share_price"], None)
-    except Exception:
-        prev_sp = None  # ok
-
-    d = begin
-    while d <= today_local:
-        ts = _snapshot_ts_for_day(d)
-        try:
-            block = find_block_at_or_before_timestamp(w3, ts)
-            snap  = read_vault_snapshot(w3, addr, block_identifier=block)
-        except Exception:
-            d += timedelta(days=1)
-            continue
-
-        sp = _to_dec(snap.get("share_price", 0))
-        asset_symbol = (snap.get("asset_symbol") or "").strip()
-        underlying = _underlying_from(name, asset_symbol)
-
-        if prev_sp and prev_sp > 0 and sp > 0:
-            daily_ret = (sp - prev_sp) / prev_sp
-            apy = (Decimal(1) + daily_ret) ** Decimal(365) - Decimal(1)
-            daily_apy_pct = float(apy * 100)
-        else:
-            daily_apy_pct = 0.0
-
-        key = (d.strftime("%Y-%m-%d"), addr.lower())
-        if key not in existing_keys:
-            row = {
-                "date": d.strftime("%Y-%m-%d"),
-                "vault_name": name,
-                "vault_address": addr,
-                "underlying_token": underlying,
-                "daily_apy_pct": daily_apy_pct,
-            }
-            df_comp = pd.concat([df_comp, pd.DataFrame([row])], ignore_index=True)
-            df_comp = (
-                df_comp.drop_duplicates(subset=["date","vault_address"])
-                       .sort_values(["underlying_token","vault_name","date"])
-                       .reset_index(drop=True)
-            )
-            _save_comparisons_csv(df_comp)
-            existing_keys.add(key)
-
-        prev_sp = sp
-        d += timedelta(days=1)
-
-    done += 1
-    progress.progress(done / total_tasks, text=f"{name}: updated")
-
-progress.empty()
-
-if df_comp.empty:
-    st.info("No APY data yet. Ensure your RPC works and the vault addresses are valid ERC-4626.")
-    st.stop()
+# Date range: only the selected days are read from the table; tables show
+# them all, charts thin them (LTTB) to CHART_WIDTH_PX points per vault.
+first_day, last_day = date.fromisoformat(first_date), date.fromisoformat(last_date)
+zoom = (first_day, last_day)
+if first_day < last_day:
+    zoom = st.slider("Date range", min_value=first_day, max_value=last_day,
+                     value=(first_day, last_day), format="YYYY-MM-DD", key="zoom-comparisons")
+df_comp = load_comparisons(since=zoom[0].isoformat(), until=zoom[1].isoformat())
 
 st.markdown(
-    f"<p class='small-note'>Aggregated rows: <b>{len(df_comp):,}</b>  ·  File: <code>{COMPARISON_CSV_PATH}</code></p>",
+    f"<p class='small-note'>Aggregated rows: <b>{len(df_comp):,}</b>  ·  Table: <code>apy_comparisons</code></p>",
     unsafe_allow_html=True
 )
 
@@ -270,6 +129,7 @@ st.markdown(
 # Display comparison tables & charts
 # ----------------------------
 df_comp["date"] = pd.to_datetime(df_comp["date"])
+
 underlyings = sorted([
     u for u in df_comp["underlying_token"].fillna("").unique()
     if str(u).strip() != ""
@@ -293,12 +153,11 @@ for u in underlyings:
     ).sort_index(ascending=False)   # <<< newest first
     pivot = pivot.reindex(sorted(pivot.columns), axis=1)
 
-    # Show table (format as % with 2 decimals)
-    disp = pivot.copy()
-    for c in disp.columns:
-        disp[c] = disp[c].map(lambda x: f"{x:.2f}%" if pd.notnull(x) else "")
+    # Show table (numeric columns, shown as % with 2 decimals)
+    col_cfg = {c: st.column_config.NumberColumn(format="%.2f%%") for c in pivot.columns}
+    col_cfg["_index"] = st.column_config.DateColumn("date", format="YYYY-MM-DD")
     st.markdown('<div class="df-wrap">', unsafe_allow_html=True)
-    st.dataframe(disp, use_container_width=True)
+    st.dataframe(pivot, use_container_width=True, column_config=col_cfg)
     st.markdown('</div>', unsafe_allow_html=True)
 
     # Long form for chart (chart will handle time on X; keep chronological order)
@@ -308,6 +167,7 @@ for u in underlyings:
     if long.empty:
         st.caption("No chart data for this token yet.")
         continue
+    long = downsample(long, "date", ["daily_apy_pct"], by="vault_name")
 
     chart = (
         alt.Chart(long)
@@ -330,8 +190,9 @@ for u in underlyings:
 # Footer
 # ----------------------------
 st.markdown(
-    "<p class='small-note'>This page calls each ERC-4626 vault directly at the daily snapshot block, "
+    "<p class='small-note'>The collector calls each ERC-4626 vault directly at the daily snapshot block, "
     "computes APY from share-price change (annualized), and appends rows to "
-    "<code>data/apy_comparisons.csv</code>. Add more vaults in the VAULTS list above.</p>",
+    "the <code>apy_comparisons</code> table (exported to <code>data/apy_comparisons.csv</code>). "
+    "Add more vaults to COMPARISON_VAULTS in <code>src/app_config.py</code>.</p>",
     unsafe_allow_html=True
 )
\ No newline at end of file
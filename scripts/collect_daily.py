@@ -0,0 +1,158 @@
+# scripts/collect_daily.py
+"""
+Headless collector: backfills and updates the daily vault rows, the
+reallocation history and the APY comparisons in the local database, so the
+pages only read stored data.
+
+    python scripts/collect_daily.py                        # everything, resume after the last stored day
+    python scripts/collect_daily.py --vault "Morpho USDC Prime" --only vaults
+    python scripts/collect_daily.py --since 2025-10-01 --until 2025-10-31 --workers 4
+    python scripts/collect_daily.py --daemon --realloc-every 30
+
+Each (dataset, vault) is one job; jobs run on a thread pool (--workers), and
+every backfill keeps up to --concurrency RPC requests in flight.
+Exits with status 1 if any job failed.
+
+With --daemon it keeps running: vault rows and comparisons are collected
+once a day, shortly after SNAPSHOT_LOCAL_TIME (see src/scheduler.py), and
+reallocations every --realloc-every minutes. Missed runs are caught up on
+start; the last run of each task is kept in data/collector_state.json.
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.app_config import COMPARISON_VAULTS, VAULTS  # noqa: E402
+from src.backfill import BACKFILL_CONCURRENCY  # noqa: E402
+from src.chain import get_w3  # noqa: E402
+from src.collect import collect_comparisons, collect_vault, parse_day  # noqa: E402
+from src.reallocations import collect_reallocations  # noqa: E402
+from src.scheduler import STATE_PATH, Scheduler, Task  # noqa: E402
+from src.storage import wait_for_exports  # noqa: E402
+
+DATASETS = ("vaults", "reallocations", "comparisons")
+DAILY_DATASETS = ("vaults", "comparisons")
+
+log = logging.getLogger("collect_daily")
+
+def _matches(v: dict, selectors) -> bool:
+    if not selectors:
+        return True
+    keys = {v["name"].lower(), v["address"].lower()}
+    return any(s.lower() in keys for s in selectors)
+
+def _jobs(w3, datasets, selectors, since, until, concurrency):
+    """[(label, fn)] for the selected datasets and vaults (until=None: up to the last snapshot day)."""
+    jobs = []
+    for v in VAULTS:
+        if not _matches(v, selectors):
+            continue
+        if "vaults" in datasets:
+            jobs.append((f"vault {v['name']}", lambda v=v: _vault_job(w3, v, since, until, concurrency)))
+        if "reallocations" in datasets and v.get("roles_modifier"):
+            jobs.append((f"reallocations {v['name']}", lambda v=v: f"{collect_reallocations(w3, v)} txs added"))
+    if "comparisons" in datasets:
+        comp = [v for v in COMPARISON_VAULTS if _matches(v, selectors)]
+        if comp:
+            jobs.append(("comparisons", lambda: f"{collect_comparisons(w3, comp, since, until, concurrency=concurrency)} rows added"))
+    return jobs
+
+def _vault_job(w3, v, since, until, concurrency) -> str:
+    n, errors = collect_vault(w3, v, since=since, until=until, concurrency=concurrency)
+    for date_str, err in sorted(errors.items()):
+        log.warning("vault %s %s: %s", v["name"], date_str, err)
+    return f"{n} rows written" + (f", {len(errors)} days skipped" if errors else "")
+
+def _run_jobs(jobs, workers: int) -> int:
+    """Run the jobs on a thread pool, logging each result; returns how many failed."""
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="collect") as pool:
+        started = {pool.submit(fn): (label, time.monotonic()) for label, fn in jobs}
+        for fut in as_completed(started):
+            label, t0 = started[fut]
+            try:
+                log.info("%s: %s (%.1fs)", label, fut.result(), time.monotonic() - t0)
+            except Exception as e:
+                failed += 1
+                log.error("%s failed: %s", label, e)
+    wait_for_exports()
+    return failed
+
+def _scheduled_run(args, datasets, until=None) -> None:
+    """One scheduled run; raises if any job failed, so the scheduler retries it."""
+    jobs = _jobs(get_w3(), datasets, args.vault, None, until, args.concurrency)
+    failed = _run_jobs(jobs, args.workers)
+    if failed:
+        raise RuntimeError(f"{failed} of {len(jobs)} job(s) failed")
+
+def _daemon(args) -> int:
+    tasks = []
+    daily = [d for d in DAILY_DATASETS if d in args.only]
+    if daily:
+        tasks.append(Task("daily", lambda day: _scheduled_run(args, daily, until=day)))
+    if "reallocations" in args.only:
+        tasks.append(Task("reallocations", lambda _: _scheduled_run(args, ["reallocations"]),
+                          every=args.realloc_every * 60))
+    sched = Scheduler(tasks, state_path=args.state)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: sched.stop())
+
+    now = datetime.now(pytz.UTC)
+    for t in tasks:
+        log.info("task %s: next run %s", t.name, sched.next_due(t, now).isoformat())
+    sched.run_forever()
+    log.info("stopped")
+    return 0
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Collect vault, reallocation and comparison data into the local database.")
+    p.add_argument("--since", help="first day to (re)collect, YYYY-MM-DD (default: the day after the last stored one)")
+    p.add_argument("--until", help="last day to collect, YYYY-MM-DD (default: the last day whose snapshot time has passed)")
+    p.add_argument("--vault", action="append", metavar="NAME_OR_ADDRESS",
+                   help="only this vault (repeatable; matches VAULTS and COMPARISON_VAULTS)")
+    p.add_argument("--only", default=",".join(DATASETS),
+                   help=f"comma-separated datasets to collect (default: {','.join(DATASETS)})")
+    p.add_argument("--workers", type=int, default=4, help="jobs run in parallel (default: 4)")
+    p.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY,
+                   help=f"max RPC requests in flight per backfill (default: {BACKFILL_CONCURRENCY})")
+    p.add_argument("--daemon", action="store_true", help="keep running and collect on schedule")
+    p.add_argument("--realloc-every", type=int, default=60, metavar="MINUTES",
+                   help="daemon: minutes between reallocation scans (default: 60)")
+    p.add_argument("--state", default=STATE_PATH, help=f"daemon: state file (default: {STATE_PATH})")
+    p.add_argument("-v", "--verbose", action="store_true")
+    args = p.parse_args(argv)
+    args.only = [d.strip() for d in args.only.split(",") if d.strip()]
+    unknown = [d for d in args.only if d not in DATASETS]
+    if unknown:
+        p.error(f"unknown dataset(s): {', '.join(unknown)}")
+    if args.daemon and (args.since or args.until):
+        p.error("--since / --until cannot be combined with --daemon")
+    if args.realloc_every < 1:
+        p.error("--realloc-every must be at least 1 minute")
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    if not args.verbose:
+        logging.getLogger("web3").setLevel(logging.WARNING)
+    if args.daemon:
+        return _daemon(args)
+
+    since = parse_day(args.since) if args.since else None
+    until = parse_day(args.until) if args.until else None
+    jobs = _jobs(get_w3(), args.only, args.vault, since, until, args.concurrency)
+    if not jobs:
+        log.warning("nothing to collect (check --vault / --only)")
+        return 0
+    return 1 if _run_jobs(jobs, args.workers) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# src/analytics.py
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+DAYS_PER_YEAR = 365
+
+# Stored columns summarize() reads (enough for a column-projected load)
+SUMMARY_COLUMNS = [
+    "date", "share_price", "yield_earned", "total_assets", "asset_symbol",
+    "total_assets_raw", "total_supply_raw", "asset_decimals", "vault_decimals",
+]
+
+def _ints(values) -> np.ndarray:
+    """uint256 values (ints, digit strings, NaN/None) as an object array of Python ints; 0 when missing."""
+    out = np.zeros(len(values), dtype=object)
+    for i, x in enumerate(values):
+        if x is None or x != x or x == "":  # None / NaN / empty CSV cell
+            continue
+        out[i] = int(x)
+    return out
+
+def _col(df: pd.DataFrame, name: str, dtype=float) -> np.ndarray:
+    if name not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=dtype)
+
+def _raw(df: pd.DataFrame, name: str) -> np.ndarray:
+    return _ints(df[name].tolist()) if name in df.columns else np.zeros(len(df), dtype=object)
+
+def _scale(decimals: np.ndarray) -> np.ndarray:
+    """10**decimals as Python ints (0 where unknown, which marks the row as not exact)."""
+    out = np.zeros(len(decimals), dtype=object)
+    ok = ~np.isnan(decimals)
+    out[ok] = [10 ** int(d) for d in decimals[ok]]
+    return out
+
+def _divide(num: np.ndarray, den: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """num / den as float64 where mask (int / int true division rounds once), NaN elsewhere."""
+    out = np.full(len(mask), np.nan)
+    if mask.any():
+        out[mask] = (num[mask] / den[mask]).astype(float)
+    return out
+
+class _Totals(NamedTuple):
+    ta: np.ndarray  # raw totalAssets (Python ints, 0 = unknown)
+    ts: np.ndarray  # raw totalSupply
+    sa: np.ndarray  # 10**asset_decimals (0 = unknown)
+    sv: np.ndarray  # 10**vault_decimals
+    sp: np.ndarray  # share price (float64, NaN = unknown)
+
+def _totals(df: pd.DataFrame) -> _Totals:
+    """Parse the raw columns once; every metric below works on these arrays."""
+    ta, ts = _raw(df, "total_assets_raw"), _raw(df, "total_supply_raw")
+    sa, sv = _scale(_col(df, "asset_decimals")), _scale(_col(df, "vault_decimals"))
+    exact = (ta > 0) & (ts > 0) & (sa > 0) & (sv > 0)
+    sp = np.where(exact, _divide(ta * sv, ts * sa, exact), _col(df, "share_price"))
+    return _Totals(ta, ts, sa, sv, sp)
+
+def _returns(t: _Totals) -> np.ndarray:
+    r = np.full(len(t.sp), np.nan)
+    if len(r) < 2:
+        return r
+    sp = t.sp
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r[1:] = np.where((sp[:-1] > 0) & (sp[1:] > 0), sp[1:] / sp[:-1] - 1.0, np.nan)
+    ta, ts = t.ta, t.ts
+    exact = (ta[1:] > 0) & (ts[1:] > 0) & (ta[:-1] > 0) & (ts[:-1] > 0)
+    num = ta[1:] * ts[:-1] - ta[:-1] * ts[1:]
+    r[1:] = np.where(exact, _divide(num, ts[1:] * ta[:-1], exact), r[1:])
+    return r
+
+def _yields(t: _Totals, stored: np.ndarray) -> np.ndarray:
+    y = stored.copy()
+    if len(y) < 2:
+        return np.nan_to_num(y)
+    ta, ts, sa, sv, sp = t
+    has_supply = (ts[1:] > 0) & (sv[1:] > 0)
+    supply = _divide(ts[1:], sv[1:], has_supply)
+    approx = has_supply & (sp[:-1] > 0) & (sp[1:] > 0)
+    y[1:] = np.where(approx, (sp[1:] - sp[:-1]) * supply, y[1:])
+
+    exact = (ta[1:] > 0) & (ts[1:] > 0) & (ta[:-1] > 0) & (ts[:-1] > 0) & (sa[1:] > 0)
+    num = ta[1:] * ts[:-1] - ta[:-1] * ts[1:]
+    y[1:] = np.where(exact, _divide(num, ts[:-1] * sa[1:], exact), y[1:])
+    return np.nan_to_num(y)
+
+def share_prices(df: pd.DataFrame) -> np.ndarray:
+    """
+    Share price per row: totalAssets / totalSupply in whole units, from the raw
+    integer columns where present, else the stored share_price float.
+    """
+    return _totals(df).sp
+
+def daily_returns(df: pd.DataFrame) -> np.ndarray:
+    """
+    sp_t / sp_{t-1} - 1 for consecutive rows (NaN for the first row and
+    where a share price is missing or zero).
+
+    When both rows carry raw totals the return is the exact integer ratio
+    (ta_t * ts_p - ta_p * ts_t) / (ts_t * ta_p), rounded to float once; the
+    decimals cancel out, and no precision is lost to subtracting two close
+    share prices.
+    """
+    return _returns(_totals(df))
+
+def daily_yields(df: pd.DataFrame) -> np.ndarray:
+    """
+    Yield of each day in asset units: (sp_t - sp_{t-1}) * supply_t.
+
+    Exact from raw totals where both rows have them, i.e.
+    (ta_t * ts_p - ta_p * ts_t) / (ts_p * 10**asset_decimals); else from the
+    share prices and the day's supply; else the stored yield_earned (0 for
+    the first row).
+    """
+    return _yields(_totals(df), _col(df, "yield_earned"))
+
+def annualize(log_growth, days) -> np.ndarray:
+    """(1 + g) ** (365 / days) - 1 for g = exp(log_growth) - 1, computed in log space."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.expm1(np.asarray(log_growth, dtype=float) * (DAYS_PER_YEAR / np.asarray(days, dtype=float)))
+
+def apy_from_returns(returns) -> np.ndarray:
+    """Daily returns compounded over a year: (1 + r) ** 365 - 1."""
+    with np.errstate(invalid="ignore"):
+        return np.expm1(DAYS_PER_YEAR * np.log1p(np.asarray(returns, dtype=float)))
+
+def _day_numbers(df: pd.DataFrame) -> np.ndarray:
+    return pd.to_datetime(df["date"], format="%Y-%m-%d").to_numpy(dtype="datetime64[D]").astype("int64")
+
+def _trailing(sp: np.ndarray, day: np.ndarray, days: int) -> np.ndarray:
+    """
+    Annualized APY over the last `days` days for every row, from the share
+    price of the latest row at least `days` before it (NaN while the series
+    is shorter than that). Rows must be sorted by day.
+    """
+    out = np.full(len(sp), np.nan)
+    valid = np.flatnonzero(sp > 0)
+    if len(valid) < 2:
+        return out
+    j = np.searchsorted(day[valid], day - days, side="right") - 1
+    ok = (j >= 0) & (sp > 0)
+    base = valid[np.maximum(j, 0)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[ok] = annualize(np.log(sp[ok]) - np.log(sp[base[ok]]), (day - day[base])[ok])
+    return out
+
+def apy_between(sp_first, sp_last, days) -> float:
+    """Annualized APY from share price sp_first to sp_last over `days` days; 0.0 if undefined."""
+    try:
+        sp_first, sp_last, days = float(sp_first), float(sp_last), float(days)
+    except (TypeError, ValueError):
+        return 0.0
+    if not (sp_first > 0 and sp_last > 0 and days > 0):
+        return 0.0
+    return float(annualize(np.log(sp_last) - np.log(sp_first), days))
+
+def summary_apy(summary: dict) -> float:
+    """Since-inception APY of a storage.vault_summaries() record; 0.0 if undefined."""
+    first, last = summary.get("first_date"), summary.get("last_date")
+    if not first or not last:
+        return 0.0
+    days = (pd.Timestamp(last) - pd.Timestamp(first)).days
+    return apy_between(summary.get("first_share_price"), summary.get("last_share_price"), days)
+
+def _since_inception(sp: np.ndarray, day: np.ndarray) -> float:
+    valid = np.flatnonzero(sp > 0)
+    if len(valid) < 2:
+        return 0.0
+    i, k = valid[0], valid[-1]
+    return apy_between(sp[i], sp[k], day[k] - day[i])
+
+def vault_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One vault's daily rows (any order) sorted by date, with share_price,
+    daily_return, apy (daily, annualized), apy_7d, apy_30d and yield_earned
+    recomputed for the whole series.
+    """
+    out = df.sort_values("date").reset_index(drop=True)
+    t = _totals(out)
+    day = _day_numbers(out)
+    r = _returns(t)
+    out["yield_earned"] = _yields(t, _col(out, "yield_earned"))
+    out["share_price"] = t.sp
+    out["daily_return"] = r
+    out["apy"] = np.nan_to_num(apy_from_returns(r))
+    out["apy_7d"] = _trailing(t.sp, day, 7)
+    out["apy_30d"] = _trailing(t.sp, day, 30)
+    return out
+
+def summarize(df: pd.DataFrame) -> dict:
+    """
+    Headline numbers for one vault: ann_apy (since inception), apy_7d,
+    apy_30d, total_yield, latest share_price / total_assets and asset_symbol.
+    """
+    if df.empty:
+        return {"ann_apy": 0.0, "apy_7d": 0.0, "apy_30d": 0.0, "total_yield": 0.0,
+                "share_price": 0.0, "total_assets": 0.0, "asset_symbol": ""}
+    m = vault_metrics(df)
+    sp = m["share_price"].to_numpy()
+    latest = m.iloc[-1]
+    sym = latest.get("asset_symbol", "")
+    return {
+        "ann_apy": _since_inception(sp, _day_numbers(m)),
+        "apy_7d": float(np.nan_to_num(m["apy_7d"].iloc[-1])),
+        "apy_30d": float(np.nan_to_num(m["apy_30d"].iloc[-1])),
+        "total_yield": float(m["yield_earned"].sum()),
+        "share_price": float(np.nan_to_num(latest["share_price"])),
+        "total_assets": float(np.nan_to_num(pd.to_numeric(latest.get("total_assets"), errors="coerce"))),
+        "asset_symbol": "" if pd.isna(sym) else sym,
+    }
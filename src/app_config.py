@@ -58,4 +58,21 @@ VAULTS = [
             "0xff527fe9c6516f9d82a3d51422ccb031d123266e6e26d4c22c942a948c180a75",
         ],
     },
-]
\ No newline at end of file
+]
+
+# ---- Comparisons page ----
+COMPARISON_START_DATE = "2025-09-01"   # inclusive, YYYY-MM-DD
+
+# Vaults to compare (can differ from VAULTS)
+COMPARISON_VAULTS = [
+    {"name": "kpk USDC Prime",      "address": "0xe108fbc04852B5df72f9E44d7C29F47e7A993aDd", "note": "USDC"},
+    {"name": "kpk WETH Yield",      "address": "0x234E5AE16eDf321AB5c2DDeBb0CCdf05aACb233b", "note": "WETH"},
+    {"name": "kpk EURC Yield",      "address": "0x0c6aec603d48eBf1cECc7b247a2c3DA08b398DC1", "note": "EURC"},
+    {"name": "Steakhouse USDC",     "address": "0xBEEF01735c132Ada46AA9aA4c54623cAA92A64CB", "note": "USDC"},
+    {"name": "Gauntlet USDC Prime", "address": "0xdd0f28e19C1780eb6396170735D45153D261490d", "note": "USDC"},
+    {"name": "Smokehouse USDC",     "address": "0xBEeFFF209270748ddd194831b3fa287a5386f5bC", "note": "USDC"},
+    {"name": "Steakhouse WETH",     "address": "0xBEEf050ecd6a16c4e7bfFbB52Ebba7846C4b8cD4", "note": "WETH"},
+    {"name": "Gauntlet WETH Prime", "address": "0x2371e134e3455e0593363cBF89d3b6cf53740618", "note": "WETH"},
+    {"name": "MEV Capital wETH",     "address": "0x9a8bC3B04b7f3D87cfC09ba407dCED575f2d61D8", "note": "WETH"},
+    {"name": "Gauntlet EURC Core",  "address": "0x2ed10624315b74a78f11FAbedAa1A228c198aEfB", "note": "EURC"},
+]
@@ -0,0 +1,291 @@
+# src/backfill.py
+import asyncio
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal, getcontext
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pytz
+from web3 import AsyncWeb3, Web3
+
+from src.analytics import apy_from_returns, daily_returns, daily_yields
+from src.app_config import SNAPSHOT_LOCAL_TIME
+from src.chain import (
+    _env_int, _rpc_cache_enabled, _rpc_endpoints, checksum,
+    find_block_at_or_before_timestamp, find_blocks_for_timestamps,
+)
+from src.erc4626 import (
+    MULTICALL3_ABI, MULTICALL3_ADDRESS,
+    decode_snapshots, multicall_available, read_vault_snapshot_direct, snapshot_calls, vault_meta,
+)
+from src.events import _asset_decimals, daily_deposits_withdraws, flows_store
+from src.fees import daily_fees, fee_store
+from src.rpc_cache import RPCCacheMiddleware
+from src.rpc_pool import AsyncRPCPoolProvider, RPCPoolProvider
+
+getcontext().prec = 50
+TZ = pytz.timezone("Europe/Amsterdam")
+
+# BACKFILL_CONCURRENCY=16 -> max RPC requests in flight during a backfill
+BACKFILL_CONCURRENCY = _env_int("BACKFILL_CONCURRENCY", 16)
+
+Progress = Optional[Callable[[int, int, str], None]]
+
+# Row fields src.analytics needs for apy / yield
+SERIES_FIELDS = ("share_price", "total_assets_raw", "total_supply_raw", "asset_decimals", "vault_decimals")
+
+def local_time(d: date, t=dtime(0, 0)) -> datetime:
+    """
+    Wall-clock time t on local day d as an aware datetime. localize() picks
+    the offset in effect on that day (CET / CEST); tzinfo=TZ would pin the
+    zone's historical LMT offset. A time skipped by the spring-forward gap
+    moves forward by the gap.
+    """
+    return TZ.normalize(TZ.localize(datetime.combine(d, t)))
+
+def day_timestamps(d: date, snapshot_time=SNAPSHOT_LOCAL_TIME) -> Tuple[int, int, int]:
+    """(since_ts, until_ts, snap_ts) in UTC for local day d (23 or 25 hours long on DST switches)."""
+    return (
+        int(local_time(d).timestamp()),
+        int(local_time(d + timedelta(days=1)).timestamp()) - 1,
+        int(local_time(d, snapshot_time).timestamp()),
+    )
+
+def _async_w3(w3: Optional[Web3] = None) -> AsyncWeb3:
+    """
+    Short-lived async client for one backfill run (its aiohttp session is bound
+    to the run's event loop). With several endpoints it routes, hedges and
+    fails over like get_w3() (src/rpc_pool.py), sharing the endpoint health of
+    w3's pool when w3 has one.
+    """
+    endpoints = _rpc_endpoints()
+    if not endpoints:
+        raise RuntimeError("WEB3_HTTP_PROVIDER missing in .env")
+    timeout = _env_int("WEB3_TIMEOUT", 30)
+    pool = getattr(w3, "provider", None)
+    if isinstance(pool, RPCPoolProvider):
+        provider = AsyncRPCPoolProvider(pool.endpoints, timeout=timeout)
+    elif len(endpoints) > 1:
+        provider = AsyncRPCPoolProvider(endpoints, timeout=timeout)
+    else:
+        provider = AsyncWeb3.AsyncHTTPProvider(endpoints[0], request_kwargs={"timeout": timeout})
+    aw3 = AsyncWeb3(provider)
+    if _rpc_cache_enabled():
+        aw3.middleware_onion.inject(RPCCacheMiddleware, name="rpc_cache", layer=0)
+    return aw3
+
+class _Engine:
+    """Async readers sharing one client and one concurrency limit."""
+
+    def __init__(self, w3: Web3, aw3: AsyncWeb3, concurrency: int):
+        self.w3 = w3
+        self.aw3 = aw3
+        self.sem = asyncio.Semaphore(max(1, concurrency))
+        self.multicall = aw3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+
+    async def _aggregate3(self, calls, block):
+        async with self.sem:
+            return await self.multicall.functions.aggregate3(
+                [(t, True, d) for t, d in calls]
+            ).call(block_identifier=block)
+
+    async def _in_thread(self, fn, *args):
+        """Run a blocking (sync w3) helper without exceeding the concurrency limit."""
+        async with self.sem:
+            return await asyncio.to_thread(fn, *args)
+
+    async def snapshots(self, vault_addrs: List[str], block) -> Tuple[Dict[str, dict], Dict[str, Exception]]:
+        """
+        ERC-4626 snapshots of many vaults at one block with a single Multicall3
+        eth_call. Immutable fields (asset, decimals, symbol) come from the
+        metadata registry, so only totalAssets/totalSupply are read per block.
+        A vault whose sub-calls revert is retried with individual calls; if
+        that fails too it is left out and its exception returned in errors.
+        """
+        out, errors, metas = {}, {}, {}
+        for a in vault_addrs:
+            try:
+                # registry hit after the first read; never an RPC call per block
+                metas[a] = await self._in_thread(vault_meta, self.w3, a)
+            except Exception as e:
+                errors[a] = e
+        fallback = list(metas)
+        if metas and multicall_available(block):
+            try:
+                res = await self._aggregate3(snapshot_calls(list(metas)), block)
+                out, fallback = decode_snapshots(self.aw3.codec, metas, res)
+            except Exception:
+                fallback = [a for a in metas if a not in out]
+
+        for a in fallback:
+            try:
+                out[a] = await self._in_thread(read_vault_snapshot_direct, self.w3, a, block)
+            except Exception as e:
+                errors[a] = e
+        return out, errors
+
+    async def block_for(self, blocks: Dict[int, int], ts: int) -> int:
+        block = blocks.get(ts)
+        if block is None:
+            block = await self._in_thread(find_block_at_or_before_timestamp, self.w3, ts)
+        return block
+
+def _resolve_blocks(w3: Web3, timestamps: List[int]) -> Dict[int, int]:
+    """Batched block search (sync, see chain.find_blocks_for_timestamps); {} on failure."""
+    try:
+        return dict(zip(timestamps, find_blocks_for_timestamps(w3, timestamps)))
+    except Exception:
+        return {}
+
+async def _run(w3: Web3, body, concurrency: int):
+    aw3 = _async_w3(w3)
+    try:
+        return await body(_Engine(w3, aw3, concurrency))
+    finally:
+        try:
+            await aw3.provider.disconnect()
+        except Exception:
+            pass
+
+async def _as_completed(tasks, total: int, on_progress: Progress, label):
+    """Await tasks as they finish, reporting progress; returns their results in completion order."""
+    results = []
+    for fut in asyncio.as_completed(tasks):
+        res = await fut
+        results.append(res)
+        if on_progress:
+            on_progress(len(results), total, label(res))
+    return results
+
+def backfill_vault(w3: Web3, vault_addr: str, days: List[date], prev_row: Optional[dict] = None,
+                   on_progress: Progress = None, concurrency: int = BACKFILL_CONCURRENCY):
+    """
+    Collect the daily rows for one vault over `days`, all days concurrently.
+
+    Pass 1 (async): per day, the snapshot at SNAPSHOT_LOCAL_TIME; alongside,
+    Deposit/Withdraw and fee logs for the whole window come from the local
+    event stores and are bucketed per day by block.
+    Pass 2: apy / yield_earned from consecutive rows (src.analytics), starting
+    from prev_row (the last stored row before days[0]; its raw totals, if
+    stored, make the first day exact too).
+
+    Returns (rows, errors): rows are dicts with the VaultAppender.add
+    fields (date_str, total_assets, ...) sorted by date; errors maps date_str
+    to the reason a day was skipped.
+    """
+    vault_addr = checksum(vault_addr)
+    days = sorted(days)
+    windows = {d: day_timestamps(d) for d in days}
+    # since-1 / until bound each day's blocks exactly: the blocks after since-1 up to until
+    blocks = _resolve_blocks(w3, [t for s, u, snap in windows.values() for t in (s - 1, u, snap)])
+    scale = Decimal(10) ** _asset_decimals(w3, vault_addr)
+
+    async def day_range(eng: _Engine, d: date):
+        since_ts, until_ts, _ = windows[d]
+        first, last = await asyncio.gather(eng.block_for(blocks, since_ts - 1), eng.block_for(blocks, until_ts))
+        return first + 1, last
+
+    async def event_totals(eng: _Engine, ranges):
+        """
+        Deposit/Withdraw and fee logs for the whole backfill from the local event
+        stores (only blocks past their cursors are scanned), summed per day;
+        the exception if a scan fails.
+        """
+        try:
+            flows, fees = await asyncio.gather(
+                flows_store(vault_addr).aload(eng.aw3, ranges[0][0], ranges[-1][1], sem=eng.sem),
+                fee_store([vault_addr]).aload(eng.aw3, ranges[0][0], ranges[-1][1], sem=eng.sem),
+            )
+        except Exception as e:
+            return e
+        deps, wdrs = daily_deposits_withdraws(flows, ranges)
+        return dict(zip(days, zip(deps, wdrs, daily_fees(fees, ranges, vault_addr))))
+
+    async def one_day(eng: _Engine, d: date):
+        date_str = d.strftime("%Y-%m-%d")
+        try:
+            block_id = await eng.block_for(blocks, windows[d][2])
+        except Exception as e:
+            return date_str, None, f"failed to map timestamp to block → {e}"
+
+        snaps, errors = await eng.snapshots([vault_addr], block_id)
+        snap = snaps.get(vault_addr)
+        if snap is None:
+            return date_str, None, f"snapshot failed at block {block_id} → {errors.get(vault_addr)}"
+
+        return date_str, {
+            "date_str": date_str,
+            "total_assets": snap["total_assets"],
+            "share_price": snap["share_price"],
+            "asset_symbol": snap.get("asset_symbol") or "ASSET",
+            "total_assets_raw": snap["total_assets_raw"],
+            "total_supply_raw": snap["total_supply_raw"],
+            "asset_decimals": snap["asset_decimals"],
+            "vault_decimals": snap["vault_decimals"],
+        }, None
+
+    async def body(eng: _Engine):
+        try:
+            ranges = await asyncio.gather(*(day_range(eng, d) for d in days))
+        except Exception as e:
+            return [(d.strftime("%Y-%m-%d"), None, f"failed to map day to blocks → {e}") for d in days], {}
+        totals = asyncio.ensure_future(event_totals(eng, list(ranges)))
+        tasks = [one_day(eng, d) for d in days]
+        results = await _as_completed(tasks, len(tasks), on_progress, lambda r: r[0])
+        return results, await totals
+
+    results, totals = asyncio.run(_run(w3, body, concurrency)) if days else ([], {})
+    if isinstance(totals, Exception):
+        # without flows and fees the rows would be wrong, not just incomplete
+        results = [(date_str, None, f"event log scan failed → {totals}") for date_str, _, _ in results]
+        totals = {}
+    day_totals = {d.strftime("%Y-%m-%d"): v for d, v in totals.items()}
+
+    # Pass 2: APY / yield need the previous day's share price
+    rows, errors = [], {}
+    for date_str, row, err in sorted(results, key=lambda r: r[0]):
+        if row is None:
+            errors[date_str] = err
+            continue
+        dep_raw, wdr_raw, fee_raw = day_totals.get(date_str, (0, 0, 0))
+        row["fee_amount"] = Decimal(fee_raw)
+        row["deposits"] = (Decimal(dep_raw) / scale) if dep_raw else Decimal(0)
+        row["withdraws"] = (Decimal(wdr_raw) / scale) if wdr_raw else Decimal(0)
+        rows.append(row)
+
+    if rows:
+        seed = {k: (prev_row or {}).get(k) for k in SERIES_FIELDS}
+        # object dtype keeps uint256 totals as Python ints (no float64 upcast)
+        series = pd.DataFrame([seed] + [{k: r[k] for k in SERIES_FIELDS} for r in rows], dtype=object)
+        apys = apy_from_returns(daily_returns(series))[1:]
+        yields = daily_yields(series)[1:]
+        for row, apy, y in zip(rows, apys, yields):
+            row["apy"] = Decimal(0) if np.isnan(apy) else Decimal(float(apy))
+            row["yield_earned"] = Decimal(float(y))
+    return rows, errors
+
+def fetch_snapshots(w3: Web3, plan: Dict[int, List[str]], on_progress: Progress = None,
+                    concurrency: int = BACKFILL_CONCURRENCY) -> Dict[int, Dict[str, dict]]:
+    """
+    Snapshots for many (timestamp, vaults) pairs at once.
+
+    plan maps a UTC timestamp to the vault addresses to read at the block for
+    that time. Returns {ts: {vault: snapshot}}; vaults that could not be read
+    (or times that could not be mapped to a block) are left out.
+    """
+    blocks = _resolve_blocks(w3, sorted(plan))
+
+    async def one_time(eng: _Engine, ts: int):
+        try:
+            block = await eng.block_for(blocks, ts)
+            snaps, _ = await eng.snapshots(plan[ts], block)
+        except Exception:
+            snaps = {}
+        return ts, snaps
+
+    async def body(eng: _Engine):
+        tasks = [one_time(eng, ts) for ts in plan if plan[ts]]
+        return await _as_completed(tasks, len(tasks), on_progress, lambda r: str(r[0]))
+
+    return dict(asyncio.run(_run(w3, body, concurrency)))
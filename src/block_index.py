@@ -0,0 +1,94 @@
+# src/block_index.py
+import os
+import threading
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+# One record per sampled block: (block number, timestamp), little-endian int64.
+RECORD = np.dtype([("block", "<i8"), ("ts", "<i8")])
+
+class BlockIndex:
+    """
+    Append-only on-disk index of (block, timestamp) samples.
+
+    Every process appends the headers it had to fetch, and every reader picks up
+    what others appended by re-reading the file tail when it grows. Records are
+    written unsorted; the in-memory view is kept sorted by block.
+    Only finalized blocks should be added, so entries never need rewriting.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._offset = 0
+        self._blocks = np.empty(0, dtype="<i8")
+        self._ts = np.empty(0, dtype="<i8")
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._blocks)
+
+    def _merge(self, blocks: np.ndarray, ts: np.ndarray) -> None:
+        if len(blocks) == 0:
+            return
+        all_b = np.concatenate([self._blocks, blocks])
+        all_t = np.concatenate([self._ts, ts])
+        all_b, first = np.unique(all_b, return_index=True)
+        self._blocks = all_b
+        self._ts = all_t[first]
+
+    def _refresh(self) -> None:
+        """Load records appended (by us or other processes) since the last read."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        size -= size % RECORD.itemsize  # ignore a torn trailing write
+        if size <= self._offset:
+            return
+        with self._lock:
+            if size <= self._offset:
+                return
+            count = (size - self._offset) // RECORD.itemsize
+            tail = np.memmap(self.path, dtype=RECORD, mode="r", offset=self._offset, shape=(count,))
+            self._merge(np.array(tail["block"]), np.array(tail["ts"]))
+            del tail
+            self._offset = size
+
+    def add(self, samples: Iterable[Tuple[int, int]]) -> None:
+        """Persist new (block, ts) samples. Already-known blocks are skipped."""
+        self._refresh()
+        with self._lock:
+            known = set(self._blocks.tolist())
+            fresh = {int(b): int(t) for b, t in samples if int(b) not in known}
+            if not fresh:
+                return
+            recs = np.array(sorted(fresh.items()), dtype="<i8").view(RECORD).reshape(-1)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # O_APPEND keeps concurrent writers from interleaving inside a record batch
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, recs.tobytes())
+            finally:
+                os.close(fd)
+            self._merge(recs["block"].copy(), recs["ts"].copy())
+
+    def ts_of(self, block: int) -> Optional[int]:
+        self._refresh()
+        i = int(np.searchsorted(self._blocks, block))
+        if i < len(self._blocks) and self._blocks[i] == block:
+            return int(self._ts[i])
+        return None
+
+    def bracket(self, target_ts: int) -> Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]]]:
+        """
+        Returns ((block, ts) of the last sample with ts <= target_ts,
+                 (block, ts) of the first sample with ts > target_ts).
+        Either side is None when the index has no sample there.
+        """
+        self._refresh()
+        i = int(np.searchsorted(self._ts, target_ts, side="right"))
+        lo = (int(self._blocks[i - 1]), int(self._ts[i - 1])) if i > 0 else None
+        hi = (int(self._blocks[i]), int(self._ts[i])) if i < len(self._blocks) else None
+        return lo, hi
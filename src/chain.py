@@ -1,48 +1,266 @@
 import os
-from functools import lru_cache
+import threading
+import time
+from typing import Dict, Iterable, List
+
+import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 from web3 import Web3
 
+from src.block_index import BlockIndex
+from src.rpc_cache import RPCCacheMiddleware
+from src.rpc_pool import RPCPoolProvider
+
 load_dotenv()
 
+# Connection tuning (all optional):
+# WEB3_HTTP_PROVIDERS=url1,url2 -> several RPC endpoints (instead of WEB3_HTTP_PROVIDER)
+# WEB3_POOL_SIZE=20     -> max keep-alive connections per RPC host
+# WEB3_TIMEOUT=30       -> per-request timeout in seconds
+# WEB3_HEALTH_TTL=300   -> seconds between is_connected() checks on the shared client
+# DISABLE_RPC_CACHE=1   -> skip the on-disk cache of finalized-block RPC results
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(os.getenv(key, default))
+    except ValueError:
+        return default
+
+_CLIENT_LOCK = threading.Lock()
+_CLIENTS: Dict[tuple, Web3] = {}
+_HEALTHY_UNTIL: Dict[tuple, float] = {}
+
+def _new_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def _rpc_endpoints() -> List[str]:
+    many = os.getenv("WEB3_HTTP_PROVIDERS", "")
+    uris = [u.strip() for u in many.split(",") if u.strip()]
+    if not uris and os.getenv("WEB3_HTTP_PROVIDER"):
+        uris = [os.getenv("WEB3_HTTP_PROVIDER").strip()]
+    return uris
+
+def _rpc_cache_enabled() -> bool:
+    return os.getenv("DISABLE_RPC_CACHE", "0").strip().lower() not in ("1", "true", "yes", "on")
+
 def get_w3() -> Web3:
-    rpc = os.getenv("WEB3_HTTP_PROVIDER")
-    if not rpc:
+    """
+    Process-wide Web3 client with a keep-alive connection pool.
+
+    Every page, Streamlit session and thread in the server gets the same
+    instance, so warm reruns reuse open connections (no new TLS handshake) and
+    the per-client caches. The is_connected() round trip only runs when the
+    client is created and then at most once per WEB3_HEALTH_TTL.
+    With several endpoints in WEB3_HTTP_PROVIDERS the client routes, hedges
+    and fails over between them (see src/rpc_pool.py).
+    """
+    endpoints = _rpc_endpoints()
+    if not endpoints:
         raise RuntimeError("WEB3_HTTP_PROVIDER missing in .env")
-    w3 = Web3(Web3.HTTPProvider(rpc, request_kwargs={"timeout": 30}))
-    if not w3.is_connected():
-        raise RuntimeError("Failed to connect to RPC")
+    key = (tuple(endpoints), _env_int("WEB3_POOL_SIZE", 20), _env_int("WEB3_TIMEOUT", 30))
+
+    with _CLIENT_LOCK:
+        w3 = _CLIENTS.get(key)
+        if w3 is None:
+            _, pool_size, timeout = key
+            session = _new_session(pool_size)
+            if len(endpoints) == 1:
+                provider = Web3.HTTPProvider(endpoints[0], request_kwargs={"timeout": timeout}, session=session)
+            else:
+                provider = RPCPoolProvider(endpoints, session=session, timeout=timeout, max_workers=pool_size)
+            w3 = Web3(provider)
+            if _rpc_cache_enabled():
+                # innermost layer, so it stores raw provider responses
+                w3.middleware_onion.inject(RPCCacheMiddleware, name="rpc_cache", layer=0)
+            _CLIENTS[key] = w3
+
+    if _HEALTHY_UNTIL.get(key, 0) < time.time():
+        if not w3.is_connected():
+            raise RuntimeError("Failed to connect to RPC")
+        _HEALTHY_UNTIL[key] = time.time() + _env_int("WEB3_HEALTH_TTL", 300)
     return w3
 
 def checksum(addr: str) -> str:
     return Web3.to_checksum_address(addr)
 
-@lru_cache(maxsize=2048)
+# Blocks older than this are treated as final and persisted to the block index.
+FINALITY_SECONDS = 20 * 60
+BLOCK_INDEX_DIR = "data"
+# Upper bound on requests per JSON-RPC batch (most providers cap batches at 100-1000).
+MAX_BATCH_SIZE = 100
+# Brackets wider than this (~9 days of mainnet blocks) are narrowed with a grid.
+GRID_SPAN = 1 << 16
+
+_INDEXES = {}
+
+def _block_index(w3: Web3) -> BlockIndex:
+    """Shared on-disk block/timestamp index for the chain w3 is connected to."""
+    idx = getattr(w3, "_block_index", None)
+    if idx is None:
+        path = os.path.join(BLOCK_INDEX_DIR, f"block_index_{int(w3.eth.chain_id)}.bin")
+        idx = _INDEXES.setdefault(path, BlockIndex(path))
+        w3._block_index = idx
+    return idx
+
+def _remember(idx: BlockIndex, samples) -> Dict[int, int]:
+    """Persist final samples; returns the ones too recent to persist."""
+    cutoff = time.time() - FINALITY_SECONDS
+    final = [(b, t) for b, t in samples if t < cutoff]
+    if final:
+        idx.add(final)
+    return {b: t for b, t in samples if t >= cutoff}
+
 def _block_ts(w3: Web3, block_number: int) -> int:
-    blk = w3.eth.get_block(block_number)
-    return blk.timestamp
+    idx = _block_index(w3)
+    ts = idx.ts_of(block_number)
+    if ts is None:
+        ts = int(w3.eth.get_block(block_number).timestamp)
+        _remember(idx, [(block_number, ts)])
+    return ts
+
+def _interpolate(a, b, target_ts: int) -> int:
+    """Guess the block for target_ts on the line through samples a and b (may extrapolate)."""
+    (a_b, a_t), (b_b, b_t) = a, b
+    if a_t == b_t:
+        return (a_b + b_b) // 2
+    return a_b + (target_ts - a_t) * (b_b - a_b) // (b_t - a_t)
 
 def find_block_at_or_before_timestamp(w3: Web3, target_ts: int) -> int:
     """
     Returns the highest block number with timestamp <= target_ts.
     If target is before genesis, returns 0.
+
+    The search starts from the tightest bracket in the persistent block index and
+    interpolates on timestamps, falling back to bisection when a probe barely
+    narrows the bracket. Every final header fetched is added to the index.
     """
-    latest = w3.eth.block_number
-    # early exit if target is after latest
-    if _block_ts(w3, latest) <= target_ts:
-        return latest
-
-    low = 0
-    high = latest
-    # if target is before first block, return 0
-    if _block_ts(w3, 0) > target_ts:
-        return 0
-
-    while low < high:
-        mid = (low + high + 1) // 2
-        ts = _block_ts(w3, mid)
-        if ts <= target_ts:
-            low = mid
+    idx = _block_index(w3)
+    lo, hi = idx.bracket(target_ts)
+
+    if hi is None:
+        head = w3.eth.get_block("latest")
+        hi = (int(head.number), int(head.timestamp))
+        # early exit if target is after latest
+        if hi[1] <= target_ts:
+            return hi[0]
+    if lo is None:
+        # if target is before first block, return 0
+        lo = (0, _block_ts(w3, 0))
+        if lo[1] > target_ts:
+            return 0
+
+    bisect = False
+    prev = None
+    while hi[0] - lo[0] > 1:
+        span = hi[0] - lo[0]
+        if bisect:
+            mid = (lo[0] + hi[0]) // 2
+        else:
+            # secant through the last two probes once we have them: both are close
+            # to the target, unlike the far end of the bracket
+            mid = _interpolate(*(prev or (lo, hi)), target_ts)
+            mid = min(max(mid, lo[0] + 1), hi[0] - 1)
+        sample = (mid, _block_ts(w3, mid))
+        prev = (prev[1] if prev else (lo if sample[1] > target_ts else hi), sample)
+        if sample[1] <= target_ts:
+            lo = sample
         else:
-            high = mid - 1
-    return low
\ No newline at end of file
+            hi = sample
+        bisect = (hi[0] - lo[0]) * 4 > span * 3
+    return lo[0]
+
+def _fetch_block_ts_many(w3: Web3, numbers: Iterable[int]) -> Dict[int, int]:
+    """Fetch headers for many blocks in JSON-RPC batches (serially if batching fails)."""
+    numbers = sorted(set(numbers))
+    if len(numbers) == 1:
+        return {numbers[0]: int(w3.eth.get_block(numbers[0]).timestamp)}
+    out = {}
+    for i in range(0, len(numbers), MAX_BATCH_SIZE):
+        chunk = numbers[i:i + MAX_BATCH_SIZE]
+        try:
+            with w3.batch_requests() as batch:
+                for n in chunk:
+                    batch.add(w3.eth.get_block(n))
+                blocks = batch.execute()
+            out.update({int(b["number"]): int(b["timestamp"]) for b in blocks})
+        except Exception:
+            out.update({n: int(w3.eth.get_block(n).timestamp) for n in chunk})
+    return out
+
+def find_blocks_for_timestamps(w3: Web3, timestamps: List[int]) -> List[int]:
+    """
+    Batched find_block_at_or_before_timestamp for many targets.
+
+    Returns one block per input timestamp (same order). Each round computes the
+    probes for every unresolved target and fetches them in one JSON-RPC batch.
+    Since all probes land in the shared bracket data, neighbouring targets narrow
+    each other's bounds, so a sorted list of days resolves in a handful of rounds.
+    """
+    if not timestamps:
+        return []
+    idx = _block_index(w3)
+    targets = sorted(set(int(t) for t in timestamps))
+    found: Dict[int, int] = {}
+    # samples this call fetched that are too recent to persist (incl. head)
+    volatile: Dict[int, int] = {}
+
+    def bracket(t):
+        lo, hi = idx.bracket(t)
+        for b, ts in volatile.items():
+            if ts <= t and (lo is None or b > lo[0]):
+                lo = (b, ts)
+            elif ts > t and (hi is None or b < hi[0]):
+                hi = (b, ts)
+        return lo, hi
+
+    if bracket(targets[-1])[1] is None:
+        head = w3.eth.get_block("latest")
+        volatile[int(head.number)] = int(head.timestamp)
+    if bracket(targets[0])[0] is None:
+        volatile[0] = _block_ts(w3, 0)
+
+    spans: Dict[int, int] = {}
+    pending = targets
+    while pending:
+        probes = set()
+        still = []
+        for t in pending:
+            lo, hi = bracket(t)
+            if lo is None:
+                found[t] = 0  # before genesis
+                continue
+            if hi is None:
+                found[t] = lo[0]  # at or after head
+                continue
+            span = hi[0] - lo[0]
+            if span <= 1:
+                found[t] = lo[0]
+                continue
+            g = _interpolate(lo, hi, t)
+            if span <= 8:
+                cand = list(range(lo[0] + 1, hi[0]))
+            elif span > GRID_SPAN:
+                # far from any sample: a coarse grid shrinks the bracket 16x per
+                # round no matter how non-linear timestamps are over the range
+                step = span / 16
+                cand = [g] + [lo[0] + int(step * k) for k in range(1, 16)]
+            else:
+                # guess, its neighbour, and a window around it so a biased
+                # guess still leaves a tight bracket for the next round
+                e = max(2, span // 64)
+                cand = [g - e, g, g + 1, g + e]
+            if span * 2 > spans.get(t, span * 4):
+                cand.append((lo[0] + hi[0]) // 2)  # last round barely helped
+            spans[t] = span
+            probes.update(p for p in cand if lo[0] < p < hi[0])
+            still.append(t)
+
+        if probes:
+            samples = _fetch_block_ts_many(w3, probes)
+            volatile.update(_remember(idx, samples.items()))
+        pending = still
+    return [found[int(t)] for t in timestamps]
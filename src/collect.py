@@ -0,0 +1,179 @@
+# src/collect.py
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pytz
+from web3 import Web3
+
+from src.analytics import apy_from_returns, daily_returns
+from src.app_config import COMPARISON_START_DATE, COMPARISON_VAULTS, SNAPSHOT_LOCAL_TIME, START_DATE
+from src.backfill import (
+    BACKFILL_CONCURRENCY, SERIES_FIELDS, Progress, backfill_vault, day_timestamps, fetch_snapshots, local_time,
+)
+from src.chain import checksum
+from src.single_flight import single_flight
+from src.storage import VaultAppender, add_comparisons, comparison_last_dates, latest_rows, load_vault
+
+TZ = pytz.timezone("Europe/Amsterdam")
+
+# Data is collected by scripts/collect_daily.py; the pages only read it.
+# PAGE_BACKFILL=1 -> pages also collect missing data when viewed (no collector running)
+def page_backfill_enabled() -> bool:
+    return os.getenv("PAGE_BACKFILL", "0").strip().lower() in ("1", "true", "yes", "on")
+
+def flight_key(dataset: str, vault_addr: Optional[str] = None) -> str:
+    """single_flight key of one collection: "vault-<addr>", "reallocations-<addr>" or "comparisons"."""
+    return dataset if vault_addr is None else f"{dataset}-{vault_addr.lower()}"
+
+def snapshot_at(d: date) -> datetime:
+    """Local day d's snapshot time (SNAPSHOT_LOCAL_TIME in Europe/Amsterdam), aware."""
+    return local_time(d, SNAPSHOT_LOCAL_TIME)
+
+def last_snapshot_day(now: Optional[datetime] = None) -> date:
+    """
+    The latest local day whose snapshot time has passed: the default last
+    day to collect, so a day is never stored from a block before its snapshot.
+    """
+    now = now or datetime.now(pytz.UTC)
+    d = now.astimezone(TZ).date()
+    return d if snapshot_at(d) <= now else d - timedelta(days=1)
+
+def parse_day(s) -> date:
+    return s if isinstance(s, date) else datetime.strptime(str(s), "%Y-%m-%d").date()
+
+def _days(begin: date, end: date) -> List[date]:
+    return [begin + timedelta(days=i) for i in range((end - begin).days + 1)]
+
+def _resume_day(last: Optional[str], start: date) -> date:
+    """The day after the last stored one (never before start)."""
+    if not last:
+        return start
+    try:
+        return max(start, parse_day(last) + timedelta(days=1))
+    except Exception:
+        return start
+
+# ---------- Vault daily rows ----------
+def vault_missing_days(vault_addr: str, until: Optional[date] = None) -> List[date]:
+    """Days after the last stored row, up to `until` (last_snapshot_day() by default)."""
+    last = latest_rows(vault_addr, 1, columns=["date"])
+    begin = _resume_day(None if last.empty else last["date"].iloc[-1], parse_day(START_DATE))
+    return _days(begin, until or last_snapshot_day())
+
+def collect_vault(w3: Web3, vault_cfg: dict, since: Optional[date] = None, until: Optional[date] = None,
+                  on_progress: Progress = None, concurrency: int = BACKFILL_CONCURRENCY) -> Tuple[int, Dict[str, str]]:
+    """
+    Backfill one configured vault (src.app_config.VAULTS entry) and store the
+    rows in one transaction.
+
+    Without `since` only the days after the last stored row are read; with
+    it every day from `since` is read again and replaces the stored row.
+    Returns (rows written, {date_str: reason} for the skipped days).
+
+    One backfill per vault runs at a time (src.single_flight); a caller
+    arriving meanwhile follows its progress and gets its result.
+    """
+    vault_addr = checksum(vault_cfg["address"])
+    return single_flight(
+        flight_key("vault", vault_addr),
+        lambda progress: _collect_vault(w3, vault_cfg, vault_addr, since, until, progress, concurrency),
+        on_progress,
+    )
+
+def _collect_vault(w3, vault_cfg, vault_addr, since, until, on_progress, concurrency):
+    days = _days(since, until or last_snapshot_day()) if since else vault_missing_days(vault_addr, until)
+    if not days:
+        return 0, {}
+
+    # Previous stored row seeds the APY / yield of the first day
+    prev = load_vault(vault_addr, columns=["date", *SERIES_FIELDS], until=(days[0] - timedelta(days=1)).strftime("%Y-%m-%d"))
+    prev_row = None if prev.empty else prev.iloc[-1].to_dict()
+
+    rows, errors = backfill_vault(w3, vault_addr, days, prev_row=prev_row, on_progress=on_progress, concurrency=concurrency)
+    with VaultAppender(vault_addr, markets=vault_cfg.get("markets", [])) as tx:
+        for row in rows:
+            tx.add(**row)
+    return len(rows), errors
+
+# ---------- APY comparisons ----------
+def underlying_from(name: str, asset_symbol: Optional[str]) -> str:
+    s = (asset_symbol or "").strip()
+    if s:
+        return s.upper()
+    nm = (name or "").lower()
+    if "usdc" in nm: return "USDC"
+    if "usdt" in nm: return "WETH"
+    if "eurc" in nm: return "EURC"
+    return ""
+
+def collect_comparisons(w3: Web3, vaults: Optional[List[dict]] = None, since: Optional[date] = None,
+                        until: Optional[date] = None, on_progress: Progress = None,
+                        concurrency: int = BACKFILL_CONCURRENCY) -> int:
+    """
+    Daily APYs of the comparison vaults (COMPARISON_VAULTS by default) for the
+    days after each vault's last stored one, or from `since` on (stored
+    (vault, date) rows are kept). Returns the number of rows added.
+
+    Pass 1 reads every (day, vault) snapshot concurrently, one multicall per
+    day; pass 2 derives each vault's APYs in one vectorized pass, with the
+    day before its first missing day only seeding the previous share price.
+    Runs single-flight like collect_vault.
+    """
+    vaults = COMPARISON_VAULTS if vaults is None else vaults
+    return single_flight(
+        flight_key("comparisons"), lambda progress: _collect_comparisons(w3, vaults, since, until, progress, concurrency), on_progress,
+    )
+
+def _collect_comparisons(w3, vaults, since, until, on_progress, concurrency) -> int:
+    end = until or last_snapshot_day()
+    start = parse_day(COMPARISON_START_DATE)
+    if since:
+        begins = {v["address"]: since for v in vaults}
+    else:
+        last_dates = comparison_last_dates()
+        begins = {v["address"]: _resume_day(last_dates.get(v["address"].lower()), start) for v in vaults}
+
+    # Every snapshot needed by any vault (incl. the day before its first missing day)
+    stale = [b for b in begins.values() if b <= end]
+    if not stale:
+        return 0
+    day_plan = {
+        d: [v for v in vaults if begins[v["address"]] <= end and begins[v["address"]] - timedelta(days=1) <= d]
+        for d in _days(min(stale) - timedelta(days=1), end)
+    }
+    snap_ts = {d: day_timestamps(d)[2] for d in day_plan}
+
+    ts_plan = {snap_ts[d]: [checksum(v["address"]) for v in active] for d, active in day_plan.items()}
+    fetched = fetch_snapshots(w3, ts_plan, on_progress=on_progress, concurrency=concurrency)
+
+    series = {}
+    for d, active in day_plan.items():
+        snaps = fetched.get(snap_ts[d], {})
+        for v in active:
+            snap = snaps.get(checksum(v["address"]))
+            if snap is not None:
+                series.setdefault(v["address"], []).append((d, snap))
+
+    new_rows = []
+    for v in vaults:
+        got = series.get(v["address"], [])
+        if not got:
+            continue
+        addr = checksum(v["address"])
+        df_s = pd.DataFrame([{k: snap.get(k) for k in SERIES_FIELDS} for _, snap in got], dtype=object)
+        apys = apy_from_returns(daily_returns(df_s))
+        for (d, snap), apy in zip(got, apys):
+            if d < begins[v["address"]]:
+                continue
+            new_rows.append({
+                "date": d.strftime("%Y-%m-%d"),
+                "vault_name": v["name"],
+                "vault_address": addr,
+                "underlying_token": underlying_from(v["name"], (snap.get("asset_symbol") or "").strip()),
+                "daily_apy_pct": 0.0 if np.isnan(apy) else float(apy * 100),
+            })
+
+    return add_comparisons(new_rows) if new_rows else 0
@@ -0,0 +1,66 @@
+# src/downsample.py
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.chain import _env_int
+
+# Charts (optional):
+# CHART_WIDTH_PX=1200 -> point budget per series, in pixels of chart width. Pages draw full-width
+#                        charts (use_container_width, wide layout) whose size only the browser
+#                        knows, so this is a fixed bound for a wide screen, not a measured width.
+CHART_WIDTH_PX = _env_int("CHART_WIDTH_PX", 1200)
+
+def chart_points(width_px: int = CHART_WIDTH_PX) -> int:
+    """Points per series worth sending for a chart width_px pixels wide."""
+    return max(3, int(width_px))
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """
+    Indices of the n points Largest-Triangle-Three-Buckets keeps of (x, y)
+    (x ascending, no NaNs): the first and last point, and from each of n - 2
+    equal buckets in between the point spanning the largest triangle with
+    the one kept before it and the mean of the next bucket. All of them if
+    there are no more than n.
+    """
+    m = len(x)
+    if n >= m or n < 3:
+        return np.arange(m)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, m - 1, n - 1).astype(np.int64)
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, m - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (m - 1, m)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+def downsample(df: pd.DataFrame, x: str, ys: List[str], n: Optional[int] = None,
+               by: Optional[str] = None) -> pd.DataFrame:
+    """
+    Rows of df (sorted by x) that keep the shape of every ys column at about
+    n points each (chart_points() by default), per `by` group if given:
+    the union of the LTTB picks of each column. Rows where a column is NaN
+    are not drawn by its line, so they are left out of its pick.
+    """
+    n = n or chart_points()
+    if len(df) <= n:
+        return df
+    if by is not None:
+        parts = [downsample(g, x, ys, n) for _, g in df.groupby(by, sort=False)]
+        return pd.concat(parts) if parts else df
+    xs = df[x]
+    xv = (xs.astype("int64") if pd.api.types.is_datetime64_any_dtype(xs) else pd.to_numeric(xs)).to_numpy(dtype=float)
+    keep = np.zeros(len(df), dtype=bool)
+    for c in ys:
+        yv = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float)
+        ok = np.flatnonzero(np.isfinite(yv))
+        keep[ok[lttb(xv[ok], yv[ok], n)]] = True
+    return df[keep]
@@ -1,6 +1,10 @@
 from decimal import Decimal, getcontext
+from typing import Dict, List
+
 from web3 import Web3
 
+from src.metadata import get_registry
+
 getcontext().prec = 50
 
 ERC20_ABI = [
@@ -16,6 +20,29 @@ ERC4626_MIN_ABI = [
     {"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],"stateMutability":"view","type":"function"},
 ]
 
+# Multicall3 is deployed at the same address on mainnet and most EVM chains.
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_DEPLOY_BLOCK = 14353601  # mainnet; earlier blocks use individual calls
+
+MULTICALL3_ABI = [
+    {"inputs":[{"components":[
+        {"internalType":"address","name":"target","type":"address"},
+        {"internalType":"bool","name":"allowFailure","type":"bool"},
+        {"internalType":"bytes","name":"callData","type":"bytes"}],
+      "internalType":"struct Multicall3.Call3[]","name":"calls","type":"tuple[]"}],
+     "name":"aggregate3","outputs":[{"components":[
+        {"internalType":"bool","name":"success","type":"bool"},
+        {"internalType":"bytes","name":"returnData","type":"bytes"}],
+      "internalType":"struct Multicall3.Result[]","name":"returnData","type":"tuple[]"}],
+     "stateMutability":"payable","type":"function"},
+]
+
+def _selector(sig: str) -> bytes:
+    return bytes(Web3.keccak(text=sig)[:4])
+
+SEL_TOTAL_ASSETS = _selector("totalAssets()")
+SEL_TOTAL_SUPPLY = _selector("totalSupply()")
+
 def contract(w3: Web3, address: str, abi):
     return w3.eth.contract(address=address, abi=abi)
 
@@ -30,23 +57,7 @@ def _symbol(w3: Web3, token_addr: str, block_identifier=None) -> str:
     except Exception:
         return ""
 
-def read_vault_snapshot(w3: Web3, vault_addr: str, block_identifier=None):
-    """
-    Read an ERC-4626 snapshot at a specific historical block (or 'latest').
-
-    Returns dict with: asset, asset_decimals, asset_symbol, total_assets(_raw),
-    total_supply(_raw), share_price, vault_decimals.
-    """
-    v = contract(w3, vault_addr, ERC4626_MIN_ABI)
-
-    asset_addr = v.functions.asset().call(block_identifier=block_identifier)
-    asset_dec = _decimals(w3, asset_addr, block_identifier=block_identifier)
-    asset_sym = _symbol(w3, asset_addr, block_identifier=block_identifier)
-
-    total_assets_raw = v.functions.totalAssets().call(block_identifier=block_identifier)
-    total_supply_raw = v.functions.totalSupply().call(block_identifier=block_identifier)
-    vault_decimals = v.functions.decimals().call(block_identifier=block_identifier)
-
+def _snapshot(asset_addr, asset_dec, asset_sym, total_assets_raw, total_supply_raw, vault_decimals):
     total_assets = Decimal(total_assets_raw) / Decimal(10 ** asset_dec)
     total_supply = Decimal(total_supply_raw) / Decimal(10 ** vault_decimals)
 
@@ -64,4 +75,48 @@ def read_vault_snapshot(w3: Web3, vault_addr: str, block_identifier=None):
         "total_supply": total_supply,
         "share_price": share_price,
         "vault_decimals": vault_decimals,
-    }
\ No newline at end of file
+    }
+
+def vault_meta(w3: Web3, vault_addr: str) -> dict:
+    """Immutable vault fields (asset, decimals, symbol) from the metadata registry."""
+    return get_registry(w3).vault_meta(vault_addr)
+
+def _from_meta(meta: dict, total_assets_raw: int, total_supply_raw: int) -> dict:
+    return _snapshot(meta["asset"], meta["asset_decimals"], meta["asset_symbol"],
+                     total_assets_raw, total_supply_raw, meta["vault_decimals"])
+
+def read_vault_snapshot_direct(w3: Web3, vault_addr: str, block_identifier=None):
+    """One eth_call per field; used when Multicall3 is unavailable or a sub-call reverts."""
+    v = get_registry(w3).contract(vault_addr, ERC4626_MIN_ABI)
+    total_assets_raw = v.functions.totalAssets().call(block_identifier=block_identifier)
+    total_supply_raw = v.functions.totalSupply().call(block_identifier=block_identifier)
+    return _from_meta(vault_meta(w3, vault_addr), total_assets_raw, total_supply_raw)
+
+def multicall_available(block_identifier) -> bool:
+    return not isinstance(block_identifier, int) or block_identifier >= MULTICALL3_DEPLOY_BLOCK
+
+def snapshot_calls(vaults: List[str]):
+    """aggregate3 calls for the per-block fields: 2 per vault."""
+    calls = []
+    for a in vaults:
+        calls += [(a, SEL_TOTAL_ASSETS), (a, SEL_TOTAL_SUPPLY)]
+    return calls
+
+def decode_snapshots(codec, metas: Dict[str, dict], res):
+    """
+    Decode aggregate3 results of snapshot_calls(list(metas)) into snapshots
+    (asset, asset_decimals, asset_symbol, total_assets(_raw),
+    total_supply(_raw), share_price, vault_decimals); returns
+    ({vault: snapshot}, [vaults whose sub-calls reverted, for read_vault_snapshot_direct]).
+    """
+    out, failed = {}, []
+    for i, a in enumerate(metas):
+        (ok_ta, d_ta), (ok_ts, d_ts) = res[2 * i:2 * i + 2]
+        if not (ok_ta and ok_ts):
+            failed.append(a)
+            continue
+        try:
+            out[a] = _from_meta(metas[a], codec.decode(["uint256"], d_ta)[0], codec.decode(["uint256"], d_ts)[0])
+        except Exception:
+            failed.append(a)
+    return out, failed
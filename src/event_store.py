@@ -0,0 +1,276 @@
+# src/event_store.py
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.abi_decode import decode_logs
+from src.chain import _env_int, checksum
+from src.logs import aget_logs
+
+try:
+    import fcntl  # POSIX; elsewhere writes are only serialized within the process
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+EVENTS_DIR = os.path.join("data", "events")
+# Fallback when the node does not know the "finalized" tag.
+FALLBACK_CONFIRMATIONS = 64
+
+# EVENT_STORE_MAX_PARTS=16 -> part files a store keeps before merging them into one
+EVENT_STORE_MAX_PARTS = _env_int("EVENT_STORE_MAX_PARTS", 16)
+
+# One row per log. Amount words are decimal strings: uint256 does not fit any Arrow integer.
+SCHEMA = pa.schema([
+    ("block_number", pa.int64()),
+    ("tx_hash", pa.string()),
+    ("log_index", pa.int64()),
+    ("address", pa.string()),
+    ("topic0", pa.string()),
+    ("topic1", pa.string()),
+    ("topic2", pa.string()),
+    ("word0", pa.string()),
+    ("word1", pa.string()),
+])
+KEY = ["block_number", "tx_hash", "log_index"]
+
+def logs_to_frame(logs) -> pd.DataFrame:
+    """Flatten web3 logs into SCHEMA rows (first two data words decoded as uint256)."""
+    cols = decode_logs(logs, n_words=2)
+    for w in ("word0", "word1"):
+        cols[w] = [None if v is None else str(v) for v in cols[w]]
+    return pd.DataFrame(cols, columns=SCHEMA.names)
+
+async def finalized_block(aw3) -> int:
+    try:
+        return int((await aw3.eth.get_block("finalized"))["number"])
+    except Exception:
+        return int(await aw3.eth.block_number) - FALLBACK_CONFIRMATIONS
+
+@asynccontextmanager
+async def _holding(lock: threading.Lock):
+    """
+    Hold a threading lock from async code: it is acquired on a worker thread,
+    so the event loop keeps running, and it works across event loops (every
+    backfill runs its own). If the wait is cancelled, a late acquire is undone.
+    """
+    fut = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+    try:
+        await asyncio.shield(fut)
+    except asyncio.CancelledError:
+        fut.add_done_callback(lambda f: lock.release() if not f.cancelled() and f.result() else None)
+        raise
+    try:
+        yield
+    finally:
+        lock.release()
+
+def range_index(block_numbers, ranges: Sequence[Tuple[int, int]]) -> np.ndarray:
+    """
+    For each block number, the index of the (first, last) range containing it,
+    or -1. ranges must be sorted and non-overlapping.
+    """
+    bn = np.asarray(block_numbers, dtype="int64")
+    if not len(ranges):
+        return np.full(len(bn), -1, dtype="int64")
+    starts = np.array([a for a, _ in ranges], dtype="int64")
+    ends = np.array([b for _, b in ranges], dtype="int64")
+    i = np.searchsorted(ends, bn, side="left")
+    clipped = np.minimum(i, len(ends) - 1)
+    inside = (i < len(ends)) & (bn >= starts[clipped])
+    return np.where(inside, i, -1)
+
+class EventStore:
+    """
+    Append-only local copy of the logs emitted by `addresses` with one of `topics`.
+
+    Logs live in Parquet partitions (one file per synced block span, merged
+    into one once there are more than EVENT_STORE_MAX_PARTS) under
+    data/events/<label>-<hash>/, next to meta.json, which records the contiguous
+    block span [from, to] that is fully synced. Only finalized blocks are
+    stored; anything newer is fetched live on every read.
+
+    Files are written to unique temp names and renamed into place under an
+    exclusive flock on store.lock; reads take it shared, so processes sharing
+    a store (the collector and a page backfill) never see half a merge.
+    """
+
+    def __init__(self, label: str, addresses: List[str], topics: List[str], root: str = EVENTS_DIR):
+        self.addresses = sorted(checksum(a) for a in addresses)
+        self.topics = sorted(t.lower() for t in topics)
+        digest = hashlib.sha1(json.dumps([self.addresses, self.topics]).encode()).hexdigest()[:10]
+        self.path = os.path.join(root, f"{label}-{digest}")
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()  # one thread fetches a gap, the others wait for it
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        os.makedirs(self.path, exist_ok=True)
+        fd = os.open(os.path.join(self.path, "store.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the flock
+
+    def _write_file(self, path: str, write) -> None:
+        """write(tmp) to a unique temp file next to path, then rename it over path."""
+        fd, tmp = tempfile.mkstemp(dir=self.path, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _parts(self) -> List[str]:
+        try:
+            return sorted(os.path.join(self.path, p) for p in os.listdir(self.path) if p.endswith(".parquet"))
+        except FileNotFoundError:
+            return []
+
+    # ---- cursor ----
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def synced(self) -> Optional[Tuple[int, int]]:
+        try:
+            with open(self._meta_path()) as f:
+                meta = json.load(f)
+            return int(meta["from"]), int(meta["to"])
+        except Exception:
+            return None
+
+    def _write_meta(self, span: Tuple[int, int]) -> None:
+        meta = {"addresses": self.addresses, "topics": self.topics, "from": span[0], "to": span[1]}
+
+        def write(tmp):
+            with open(tmp, "w") as f:
+                json.dump(meta, f)
+        self._write_file(self._meta_path(), write)
+
+    def gaps(self, from_block: int, to_block: int) -> List[Tuple[int, int]]:
+        """
+        Block spans to fetch so the synced span covers [from_block, to_block].
+        Gaps always touch the synced span, so it stays one contiguous range.
+        """
+        if from_block > to_block:
+            return []
+        span = self.synced()
+        if span is None:
+            return [(from_block, to_block)]
+        out = []
+        if from_block < span[0]:
+            out.append((from_block, span[0] - 1))
+        if to_block > span[1]:
+            out.append((span[1] + 1, to_block))
+        return out
+
+    # ---- writes ----
+    def append(self, logs, from_block: int, to_block: int) -> None:
+        """Store the logs of a fully fetched span adjacent to (or starting) the synced span."""
+        table = pa.Table.from_pandas(logs_to_frame(logs), schema=SCHEMA, preserve_index=False)
+        with self._lock, self._file_lock():
+            part = os.path.join(self.path, f"part-{from_block:010d}-{to_block:010d}.parquet")
+            self._write_file(part, lambda tmp: pq.write_table(table, tmp))
+
+            span = self.synced()
+            if span is None or to_block + 1 < span[0] or from_block > span[1] + 1:
+                span = (from_block, to_block)  # not contiguous: restart the cursor here
+            else:
+                span = (min(span[0], from_block), max(span[1], to_block))
+            self._write_meta(span)
+            if len(self._parts()) > EVENT_STORE_MAX_PARTS:
+                self._compact()
+
+    def _compact(self) -> None:
+        """Merge every part into one file (caller holds the exclusive lock)."""
+        parts = self._parts()
+        spans = [os.path.basename(p)[len("part-"):-len(".parquet")].split("-") for p in parts]
+        lo, hi = min(int(a) for a, _ in spans), max(int(b) for _, b in spans)
+        df = pq.read_table(parts, schema=SCHEMA).to_pandas()
+        df = df.drop_duplicates(subset=KEY).sort_values(["block_number", "log_index"])
+        table = pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+        merged = os.path.join(self.path, f"part-{lo:010d}-{hi:010d}.parquet")
+        self._write_file(merged, lambda tmp: pq.write_table(table, tmp))
+        for p in parts:
+            if p != merged:
+                os.remove(p)
+
+    # ---- reads ----
+    def frame(self, from_block: int, to_block: int) -> pd.DataFrame:
+        """Stored logs with from_block <= block_number <= to_block (deduplicated, in chain order)."""
+        if not os.path.isdir(self.path):
+            return logs_to_frame([])
+        with self._file_lock(shared=True):
+            parts = self._parts()
+            if not parts:
+                return logs_to_frame([])
+            table = pq.read_table(
+                parts, schema=SCHEMA,
+                filters=[("block_number", ">=", from_block), ("block_number", "<=", to_block)],
+            )
+        df = table.to_pandas()
+        return df.drop_duplicates(subset=KEY).sort_values(["block_number", "log_index"]).reset_index(drop=True)
+
+    def _params(self, from_block: int, to_block: int) -> dict:
+        return {"fromBlock": from_block, "toBlock": to_block,
+                "address": self.addresses, "topics": [self.topics]}
+
+    async def aload(self, aw3, from_block: int, to_block: int, sem=None) -> pd.DataFrame:
+        """
+        All logs in [from_block, to_block]: syncs the finalized part into the
+        store (fetching only blocks past the cursor) and adds the live tail.
+        Requests run under `sem` when given. Gaps are fetched under one lock,
+        so concurrent backfills sharing this store (e.g. the fee store) scan
+        each gap once and the others wait. Raises src.logs.LogFetchError if a
+        fetch fails.
+        """
+        final = min(to_block, await finalized_block(aw3))
+        if self.gaps(from_block, final):
+            async with _holding(self._sync_lock):
+                for a, b in self.gaps(from_block, final):  # what is still missing once we hold it
+                    logs = await aget_logs(aw3, self._params(a, b), sem=sem)
+                    await asyncio.to_thread(self.append, logs, a, b)
+        frames = [self.frame(from_block, final)]
+        if to_block > final:
+            frames.append(logs_to_frame(await aget_logs(aw3, self._params(max(from_block, final + 1), to_block), sem=sem)))
+        return pd.concat(frames, ignore_index=True)
+
+_STORES: Dict[str, EventStore] = {}
+_STORES_LOCK = threading.Lock()
+
+def get_event_store(label: str, addresses: List[str], topics: List[str]) -> EventStore:
+    """Process-wide EventStore for (addresses, topics), so writers share one lock."""
+    store = EventStore(label, addresses, topics)
+    with _STORES_LOCK:
+        return _STORES.setdefault(store.path, store)
+
+def sum_by_range(df: pd.DataFrame, ranges: Sequence[Tuple[int, int]], column: str = "word0",
+                 by=None) -> pd.DataFrame:
+    """
+    Exact integer sums of `column` per range index (and `by` column(s), if given).
+    Rows outside every range are dropped. Returns columns [range, *by, total].
+    """
+    keys = ["range"] + ([by] if isinstance(by, str) else list(by or []))
+    if df.empty:
+        return pd.DataFrame(columns=keys + ["total"])
+    out = df.assign(range=range_index(df["block_number"].to_numpy(), ranges))
+    out = out[(out["range"] >= 0) & out[column].notna()]
+    # Python ints (object dtype) keep full 256-bit precision through the sum
+    out = out.assign(total=out[column].map(int))
+    return out.groupby(keys, sort=True)["total"].sum().reset_index()
@@ -0,0 +1,37 @@
+# src/live_progress.py
+import streamlit as st
+
+from src.single_flight import job_state
+
+# How often a page polls a running background job (seconds)
+POLL_EVERY = 2.0
+
+def live_progress(key: str, text: str, every: float = POLL_EVERY) -> dict:
+    """
+    Progress bar of the collection running under key (in this server's
+    background worker, the collector or another process), redrawn every
+    `every` seconds by a fragment, without rerunning the rest of the page.
+    When the job finishes the whole page reruns once, so it redraws from
+    the rows that landed. Returns job_state(key) as of this run.
+    """
+    state = job_state(key)
+    seen = f"_job_seen:{key}"
+    if state["running"]:
+        st.session_state[seen] = True
+
+    @st.fragment(run_every=every if state["running"] else None)
+    def _show():
+        cur = job_state(key)
+        if cur["running"]:
+            p = cur["progress"]
+            if p and p.get("total"):
+                st.progress(min(1.0, p["n"] / p["total"]), text=f"{text} {p['n']}/{p['total']} · {p['label']}")
+            else:
+                st.progress(0.0, text=text)
+        elif st.session_state.pop(seen, False):
+            st.rerun()
+
+    _show()
+    if state["error"] and not state["running"]:
+        st.warning(f"Last update failed: {state['error']}")
+    return state
@@ -0,0 +1,150 @@
+# src/logs.py
+import asyncio
+from contextlib import nullcontext
+from typing import AsyncIterator, Dict, List, Optional
+
+from src.chain import _env_int
+
+# Log paging (all optional):
+# LOGS_CHUNK_BLOCKS=2000    -> blocks per eth_getLogs request to start with
+# LOGS_MAX_CHUNK_BLOCKS=200000 -> upper bound when growing the chunk
+# LOGS_GROW_BELOW=1000      -> grow the chunk while responses have fewer logs than this
+# LOGS_THROTTLE_RETRIES=5   -> retries of a throttled / timed-out request (same range, backoff 1 s, 2 s, 4 s, ...)
+INITIAL_CHUNK = _env_int("LOGS_CHUNK_BLOCKS", 2_000)
+MAX_CHUNK = _env_int("LOGS_MAX_CHUNK_BLOCKS", 200_000)
+GROW_BELOW = _env_int("LOGS_GROW_BELOW", 1_000)
+THROTTLE_RETRIES = _env_int("LOGS_THROTTLE_RETRIES", 5)
+THROTTLE_BACKOFF = 1.0
+
+# The provider's explicit query-size errors: only these shrink the chunk.
+RANGE_ERROR_MARKERS = (
+    "-32005", "query returned more than", "range too large", "range is too large",
+)
+# Phrases of rate-limit / quota errors and transport timeouts: retried later,
+# over the same range (a timeout says nothing about the range being too wide).
+THROTTLE_MARKERS = (
+    "rate limit", "rate exceeded", "too many requests", "quota", "request count", "compute units",
+    "capacity", "throttl", "timeout", "timed out",
+)
+
+# Chunk size each filter's last scan ended with, per (addresses, topics);
+# the next scan of the same filter starts from it.
+_LAST_CHUNK: Dict[tuple, int] = {}
+
+class LogFetchError(Exception):
+    """eth_getLogs failed for a reason splitting the range does not fix."""
+
+def _is_throttled(e: Exception) -> bool:
+    if isinstance(e, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    msg = str(e).lower()
+    return any(m in msg for m in THROTTLE_MARKERS)
+
+def _is_range_error(e: Exception) -> bool:
+    if _is_throttled(e):
+        return False  # a smaller range would not help
+    msg = str(e).lower()
+    return any(m in msg for m in RANGE_ERROR_MARKERS)
+
+def _filter_key(params: dict) -> tuple:
+    addrs = params.get("address") or ()
+    if isinstance(addrs, str):
+        addrs = (addrs,)
+    topics = tuple(tuple(t) if isinstance(t, (list, tuple)) else t for t in params.get("topics") or ())
+    return tuple(sorted(str(a).lower() for a in addrs)), topics
+
+class _ChunkSizer:
+    def __init__(self, key: tuple):
+        self.key = key
+        self.size = max(1, min(MAX_CHUNK, _LAST_CHUNK.get(key, INITIAL_CHUNK)))
+        self.ok = 0          # widest span that succeeded
+        self.ceiling = None  # narrowest span that was rejected, minus one
+        self.throttled = 0   # throttled attempts of the current request
+
+    def _save(self) -> None:
+        _LAST_CHUNK[self.key] = self.size
+
+    def backoff(self) -> Optional[float]:
+        """Seconds to wait before retrying a throttled / timed-out request; None once out of retries."""
+        if self.throttled >= THROTTLE_RETRIES:
+            return None
+        self.throttled += 1
+        return THROTTLE_BACKOFF * 2 ** (self.throttled - 1)
+
+    def shrink(self, failed_span: int) -> bool:
+        """Halve after a range error; False once a single block still fails."""
+        if failed_span <= 1:
+            return False
+        self.ceiling = failed_span - 1 if self.ceiling is None else min(self.ceiling, failed_span - 1)
+        self.size = self.ok if 0 < self.ok < failed_span else max(1, failed_span // 2)
+        self._save()
+        return True
+
+    def grow(self, n_logs: int, span: int) -> None:
+        """Double after a light response; below a known ceiling, step halfway towards it."""
+        self.ok = max(self.ok, span)
+        if n_logs >= GROW_BELOW or span < self.size:
+            return
+        target = self.size * 2
+        if self.ceiling is not None:
+            target = min(target, (self.size + self.ceiling + 1) // 2)
+        target = min(MAX_CHUNK, target)
+        if target - self.size < max(1, self.size // 8):
+            return  # close enough to the provider's limit
+        self.size = target
+        self._save()
+
+def _as_int_block(blk) -> Optional[int]:
+    """Block number for an int / hex / 'earliest'; None for tags that mean the head."""
+    if isinstance(blk, int):
+        return blk
+    if blk in (None, "earliest"):
+        return 0
+    if isinstance(blk, str) and blk.startswith("0x"):
+        return int(blk, 16)
+    return None
+
+async def aiter_log_chunks(aw3, params: dict, sem=None) -> AsyncIterator[list]:
+    """
+    eth_getLogs over params["fromBlock"]..params["toBlock"] in adaptive chunks,
+    yielding each chunk's logs as it arrives (in block order); each request
+    runs under `sem` when given.
+
+    A chunk the provider rejects as too wide / too many results is split in
+    half and retried; chunks with few logs double the next chunk's size.
+    Rate-limit / quota errors and timeouts retry the same chunk with
+    exponential backoff. Any other failure raises LogFetchError, never an
+    empty result.
+    """
+    start = _as_int_block(params.get("fromBlock"))
+    stop = _as_int_block(params.get("toBlock", "latest"))
+    if start is None or stop is None:
+        async with sem or nullcontext():
+            head = int(await aw3.eth.block_number)
+        start = head if start is None else start
+        stop = head if stop is None else stop
+    sizer = _ChunkSizer(_filter_key(params))
+    while start <= stop:
+        end = min(stop, start + sizer.size - 1)
+        try:
+            async with sem or nullcontext():
+                logs = await aw3.eth.get_logs({**params, "fromBlock": start, "toBlock": end})
+        except Exception as e:
+            wait = sizer.backoff() if _is_throttled(e) else None
+            if wait is not None:
+                await asyncio.sleep(wait)  # outside sem: other requests keep going
+                continue
+            if _is_range_error(e) and sizer.shrink(end - start + 1):
+                continue
+            raise LogFetchError(f"eth_getLogs {start}-{end} failed: {e}") from e
+        sizer.throttled = 0
+        sizer.grow(len(logs), end - start + 1)
+        yield logs
+        start = end + 1
+
+async def aget_logs(aw3, params: dict, sem=None) -> List:
+    """All logs for params, fetched with aiter_log_chunks."""
+    out = []
+    async for logs in aiter_log_chunks(aw3, params, sem):
+        out.extend(logs)
+    return out
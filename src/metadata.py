@@ -0,0 +1,171 @@
+# src/metadata.py
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Optional
+
+from web3 import Web3
+
+try:
+    import fcntl  # POSIX; elsewhere saves are only serialized within the process
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+METADATA_DIR = os.path.join("data", "cache")
+
+ERC20_META_ABI = [
+    {"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],"stateMutability":"view","type":"function"},
+    {"inputs":[],"name":"symbol","outputs":[{"internalType":"string","name":"","type":"string"}],"stateMutability":"view","type":"function"},
+]
+ERC4626_META_ABI = ERC20_META_ABI + [
+    {"inputs":[],"name":"asset","outputs":[{"internalType":"address","name":"","type":"address"}],"stateMutability":"view","type":"function"},
+]
+
+class MetadataRegistry:
+    """
+    Fields that never change once a contract is deployed: token decimals and
+    symbol, a vault's asset() and decimals, Morpho market params.
+
+    Each is read once per address and kept in data/cache/metadata_<chainid>.json,
+    so later processes never read it again. Contract objects are cached too.
+    Failed reads are not stored, so a flaky RPC does not pin a wrong value.
+    """
+
+    def __init__(self, w3: Web3, path: str):
+        self.w3 = w3
+        self.path = path
+        self._lock = threading.Lock()
+        self._contracts: Dict[tuple, object] = {}
+        self._no_symbol = set()  # symbol() failed this process; not persisted
+        self._data = {"tokens": {}, "vaults": {}, "markets": {}}
+        self._merge_file()
+
+    def _merge_file(self) -> None:
+        """Add the entries on disk (possibly written by other processes) to ours."""
+        try:
+            with open(self.path) as f:
+                loaded = json.load(f)
+        except Exception:
+            return
+        for section, entries in self._data.items():
+            for key, fields in (loaded.get(section) or {}).items():
+                if isinstance(fields, dict):
+                    entries[key] = {**fields, **entries.get(key, {})}
+
+    def _save(self) -> None:
+        """
+        Merge with the file and replace it, under an flock on <path>.lock, so
+        collector processes resolving different entries keep each other's.
+        """
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            self._merge_file()
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(self._data, f, indent=1, sort_keys=True)
+                os.replace(tmp, self.path)
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+        finally:
+            os.close(lock_fd)  # releases the flock
+
+    def _put(self, section: str, key: str, field: str, value) -> None:
+        with self._lock:
+            self._data[section].setdefault(key, {})[field] = value
+            self._save()
+
+    def _get(self, section: str, key: str, field: str):
+        return self._data[section].get(key, {}).get(field)
+
+    def contract(self, address: str, abi):
+        """w3.eth.contract(address, abi), built once per (address, abi)."""
+        key = (address, id(abi))
+        c = self._contracts.get(key)
+        if c is None:
+            c = self._contracts.setdefault(key, self.w3.eth.contract(address=Web3.to_checksum_address(address), abi=abi))
+        return c
+
+    # ---- tokens ----
+    def token_decimals(self, token: str) -> int:
+        key = token.lower()
+        dec = self._get("tokens", key, "decimals")
+        if dec is None:
+            dec = int(self.contract(token, ERC20_META_ABI).functions.decimals().call())
+            self._put("tokens", key, "decimals", dec)
+        return dec
+
+    def token_symbol(self, token: str) -> str:
+        """symbol(), or "" for tokens without a string symbol (same as erc4626._symbol)."""
+        key = token.lower()
+        sym = self._get("tokens", key, "symbol")
+        if sym is None:
+            if key in self._no_symbol:
+                return ""
+            try:
+                sym = str(self.contract(token, ERC20_META_ABI).functions.symbol().call())
+            except Exception:
+                self._no_symbol.add(key)
+                return ""
+            self._put("tokens", key, "symbol", sym)
+        return sym
+
+    # ---- ERC-4626 vaults ----
+    def vault_asset(self, vault: str) -> str:
+        key = vault.lower()
+        asset = self._get("vaults", key, "asset")
+        if asset is None:
+            asset = str(self.contract(vault, ERC4626_META_ABI).functions.asset().call())
+            self._put("vaults", key, "asset", asset)
+        return asset
+
+    def vault_decimals(self, vault: str) -> int:
+        return self.token_decimals(vault)
+
+    def vault_meta(self, vault: str) -> dict:
+        """asset, asset_decimals, asset_symbol and vault_decimals of an ERC-4626 vault."""
+        asset = self.vault_asset(vault)
+        return {
+            "asset": asset,
+            "asset_decimals": self.token_decimals(asset),
+            "asset_symbol": self.token_symbol(asset),
+            "vault_decimals": self.vault_decimals(vault),
+        }
+
+    # ---- Morpho Blue ----
+    def market_params(self, morpho, market_id: bytes) -> tuple:
+        """idToMarketParams(id) of a Morpho Blue market: (loan, collateral, oracle, irm, lltv)."""
+        key = f"{morpho.address.lower()}:{Web3.to_hex(market_id)}"
+        params = self._get("markets", key, "params")
+        if params is None:
+            params = list(morpho.functions.idToMarketParams(market_id).call())
+            if int(params[0], 16) == 0:
+                return tuple(params)  # unknown market id (so far): do not pin it
+            self._put("markets", key, "params", params)
+        return tuple(params)
+
+_REGISTRIES: Dict[str, MetadataRegistry] = {}
+_REGISTRIES_LOCK = threading.Lock()
+
+def get_registry(w3: Web3, chain_id: Optional[int] = None) -> MetadataRegistry:
+    """Process-wide registry for the chain w3 is connected to."""
+    reg = getattr(w3, "_metadata_registry", None)
+    if reg is None:
+        cid = int(chain_id if chain_id is not None else w3.eth.chain_id)
+        path = os.path.join(METADATA_DIR, f"metadata_{cid}.json")
+        with _REGISTRIES_LOCK:
+            reg = _REGISTRIES.get(path)
+            if reg is None or reg.w3 is not w3:
+                reg = MetadataRegistry(w3, path)
+                _REGISTRIES[path] = reg
+        w3._metadata_registry = reg
+    return reg
@@ -0,0 +1,294 @@
+# src/reallocations.py
+import os
+from datetime import datetime
+from decimal import Decimal, getcontext, localcontext
+from typing import Any, Dict, List
+
+import requests
+from hexbytes import HexBytes
+from web3 import Web3
+
+from src.chain import checksum
+from src.collect import flight_key
+from src.metadata import get_registry
+from src.single_flight import single_flight
+from src.storage import add_reallocation, export_reallocations_csv, last_reallocation_block, load_reallocations
+
+getcontext().prec = 50
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+# ---------- Minimal ABIs ----------
+MORPHO_ABI = [
+    {"inputs":[{"internalType":"bytes32","name":"id","type":"bytes32"}],
+     "name":"idToMarketParams","outputs":[
+        {"internalType":"address","name":"loanToken","type":"address"},
+        {"internalType":"address","name":"collateralToken","type":"address"},
+        {"internalType":"address","name":"oracle","type":"address"},
+        {"internalType":"address","name":"irm","type":"address"},
+        {"internalType":"uint256","name":"lltv","type":"uint256"}],
+     "stateMutability":"view","type":"function"},
+    {"inputs":[{"internalType":"bytes32","name":"id","type":"bytes32"}],
+     "name":"market","outputs":[
+        {"internalType":"uint128","name":"totalSupplyAssets","type":"uint128"},
+        {"internalType":"uint128","name":"totalSupplyShares","type":"uint128"},
+        {"internalType":"uint128","name":"totalBorrowAssets","type":"uint128"},
+        {"internalType":"uint128","name":"borrowShares","type":"uint128"},
+        {"internalType":"uint128","name":"lastUpdate","type":"uint128"},
+        {"internalType":"uint128","name":"fee","type":"uint128"}],
+     "stateMutability":"view","type":"function"},
+    {"inputs":[{"internalType":"bytes32","name":"id","type":"bytes32"},
+               {"internalType":"address","name":"account","type":"address"}],
+     "name":"position","outputs":[
+        {"internalType":"uint256","name":"supplyShares","type":"uint256"},
+        {"internalType":"uint128","name":"borrowShares","type":"uint128"},
+        {"internalType":"uint128","name":"collateral","type":"uint128"}],
+     "stateMutability":"view","type":"function"},
+]
+IRM_ABI = [
+    {"inputs":[
+        {"components":[
+            {"internalType":"address","name":"loanToken","type":"address"},
+            {"internalType":"address","name":"collateralToken","type":"address"},
+            {"internalType":"address","name":"oracle","type":"address"},
+            {"internalType":"address","name":"irm","type":"address"},
+            {"internalType":"uint256","name":"lltv","type":"uint256"}],
+         "internalType":"struct MarketParams","name":"params","type":"tuple"},
+        {"components":[
+            {"internalType":"uint128","name":"totalSupplyAssets","type":"uint128"},
+            {"internalType":"uint128","name":"totalSupplyShares","type":"uint128"},
+            {"internalType":"uint128","name":"totalBorrowAssets","type":"uint128"},
+            {"internalType":"uint128","name":"borrowShares","type":"uint128"},
+            {"internalType":"uint128","name":"lastUpdate","type":"uint128"},
+            {"internalType":"uint128","name":"fee","type":"uint128"}],
+         "internalType":"struct Market","name":"market","type":"tuple"}],
+     "name":"borrowRateView","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],
+     "stateMutability":"view","type":"function"}
+]
+# Chainlink ETH/USD AggregatorV3 (mainnet)
+AGG_ABI = [
+    {"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],"stateMutability":"view","type":"function"},
+    {"inputs":[],"name":"latestRoundData","outputs":[
+        {"internalType":"uint80","name":"roundId","type":"uint80"},
+        {"internalType":"int256","name":"answer","type":"int256"},
+        {"internalType":"uint256","name":"startedAt","type":"uint256"},
+        {"internalType":"uint256","name":"updatedAt","type":"uint256"},
+        {"internalType":"uint80","name":"answeredInRound","type":"uint80"}],
+     "stateMutability":"view","type":"function"},
+    {"inputs":[{"internalType":"uint80","name":"_roundId","type":"uint80"}],
+     "name":"getRoundData","outputs":[
+        {"internalType":"uint80","name":"roundId","type":"uint80"},
+        {"internalType":"int256","name":"answer","type":"int256"},
+        {"internalType":"uint256","name":"startedAt","type":"uint256"},
+        {"internalType":"uint256","name":"updatedAt","type":"uint256"},
+        {"internalType":"uint80","name":"answeredInRound","type":"uint80"}],
+     "stateMutability":"view","type":"function"},
+]
+ETH_USD_FEED = Web3.to_checksum_address("0x5f4eC3Df9cbd43714FE2740f5E3616155c5b8419")
+
+EXEC_SELECTOR = Web3.keccak(
+    text="execTransactionWithRole(address,uint256,bytes,uint8,bytes32,bool)"
+)[:4].to_0x_hex()
+
+WAD = Decimal(10) ** 18
+SECONDS_PER_YEAR = Decimal(31_536_000)
+
+# ---------- Helpers ----------
+def eth_usd_at_block(w3: Web3, block_id: int) -> float:
+    """Return Chainlink ETH/USD price at the given block (8 decimals); 0.0 if unavailable."""
+    try:
+        eth_usd = get_registry(w3).contract(ETH_USD_FEED, AGG_ABI)
+        rd = eth_usd.functions.latestRoundData().call(block_identifier=block_id)
+        _, answer, _, _, _ = rd
+        return float(answer) / (10 ** 8)
+    except Exception:
+        return 0.0
+
+def _wei_to_eth(wei: int) -> float:
+    return float(wei) / 1e18
+
+def _tokens(wei_amt: Decimal, decs: int) -> Decimal:
+    return Decimal(wei_amt) / (Decimal(10) ** decs)
+
+def _exp(x: Decimal) -> Decimal:
+    with localcontext() as lc:
+        lc.prec = max(lc.prec, 64)
+        return x.exp()
+
+def vault_apy_at_block(w3: Web3, block_id: int, *, morpho_addr: str, mids: List[str], vault: str) -> float:
+    """
+    Supply APY (%) of the vault at a block: each market's borrow APY (IRM
+    borrowRateView) net of fee, scaled by utilization, weighted by the vault's
+    allocation over the given markets.
+    """
+    reg = get_registry(w3)
+    morpho = reg.contract(morpho_addr, MORPHO_ABI)
+    total_contrib = Decimal(0)
+    total_x      = Decimal(0)
+    for mid in mids:
+        idp = reg.market_params(morpho, HexBytes(mid))
+        mkt = morpho.functions.market(HexBytes(mid)).call(block_identifier=block_id)
+        loan, _, _, irm, _ = idp
+        tsA, tsS, tbA, _, _, fee = mkt
+        tsA = Decimal(tsA); tsS = Decimal(tsS); tbA = Decimal(tbA); feeWad = Decimal(fee)
+        if tsA == 0 or tsS == 0:
+            continue
+
+        s_shares = Decimal(morpho.functions.position(HexBytes(mid), vault).call(block_identifier=block_id)[0])
+        if s_shares == 0:
+            continue
+
+        alloc_wei = (s_shares / tsS) * tsA
+        if alloc_wei <= 0:
+            continue
+
+        decs = reg.token_decimals(loan)
+        x_tokens = _tokens(alloc_wei, decs)
+        b_tokens = _tokens(tbA, decs)
+        l_base   = _tokens(tsA - alloc_wei, decs)
+
+        if irm == ZERO_ADDRESS:
+            r_per_sec = Decimal(0)
+        else:
+            rate = reg.contract(irm, IRM_ABI).functions.borrowRateView(idp, mkt).call(block_identifier=block_id)
+            r_per_sec = Decimal(rate) / WAD
+
+        borrow_apy = _exp(r_per_sec * SECONDS_PER_YEAR) - Decimal(1)
+        if borrow_apy < 0: borrow_apy = Decimal(0)
+
+        one_minus_fee = Decimal(1) - (feeWad / WAD)
+        one_minus_fee = max(Decimal(0), min(Decimal(1), one_minus_fee))
+
+        contrib = one_minus_fee * (x_tokens * b_tokens / (l_base + x_tokens)) * borrow_apy
+        total_contrib += contrib
+        total_x += x_tokens
+    if total_x <= 0:
+        return 0.0
+    return float((total_contrib / total_x) * 100)
+
+# ---------- Etherscan v2 (paginated) ----------
+def fetch_txs_to_all_pages(address: str) -> List[Dict[str, Any]]:
+    """Fetch all normal txs via Etherscan API v2 with pagination."""
+    api_key = os.getenv("ETHERSCAN_API_KEY", "")
+    if not api_key:
+        raise RuntimeError("ETHERSCAN_API_KEY missing in .env")
+
+    base = "https://api.etherscan.io/v2/api"
+    params = {
+        "chainid": 1,
+        "module": "account",
+        "action": "txlist",
+        "address": address,
+        "sort": "asc",
+        "apikey": api_key,
+    }
+
+    all_records = []
+    next_token = None
+
+    while True:
+        p = dict(params)
+        if next_token:
+            p["page"] = next_token
+        r = requests.get(base, params=p, timeout=30)
+        r.raise_for_status()
+        j = r.json()
+        result = j.get("result", {})
+        if isinstance(result, dict) and "records" in result:
+            recs = result.get("records", [])
+            all_records.extend(recs)
+            next_token = result.get("nextPageToken")
+            if not next_token:
+                break
+        elif isinstance(result, list):
+            all_records.extend(result)
+            break
+        else:
+            raise RuntimeError(f"Etherscan returned unexpected structure: {result}")
+    return all_records
+
+def allocator_execs(all_txs: List[Dict[str, Any]], allocator_eoa: str, roles_modifier: str,
+                    from_block: int = 0) -> List[Dict[str, Any]]:
+    """EOA → Roles Modifier execTransactionWithRole txs from `from_block` on (inclusive), oldest first."""
+    txs = [
+        t for t in all_txs
+        if t.get("from", "").lower() == allocator_eoa.lower()
+        and t.get("to", "").lower() == roles_modifier.lower()
+        and str(t.get("input", "")).lower().startswith(EXEC_SELECTOR.lower())
+        and int(t.get("blockNumber", 0)) >= from_block
+    ]
+    txs.sort(key=lambda t: int(t.get("blockNumber", 0)))
+    return txs
+
+def reallocation_row(w3: Web3, t: Dict[str, Any], *, vault: str, morpho_addr: str, mids: List[str]) -> dict:
+    """One stored row (page column names): gas in ETH / USD and the vault APY right before and after the tx."""
+    tx_hash = t["hash"]
+    blk = int(t["blockNumber"])
+    date_utc = datetime.utcfromtimestamp(int(t["timeStamp"]))
+
+    # Gas (ETH & USD at tx block)
+    try:
+        rcpt = w3.eth.get_transaction_receipt(tx_hash)
+        gas_used = int(rcpt["gasUsed"])
+        egp = rcpt.get("effectiveGasPrice") or w3.eth.get_transaction(tx_hash).get("gasPrice", 0)
+        gas_eth = _wei_to_eth(gas_used * int(egp))
+    except Exception:
+        gas_eth = 0.0
+
+    eth_usd = eth_usd_at_block(w3, blk)
+    gas_usd = gas_eth * eth_usd if eth_usd > 0 else 0.0
+
+    # APY at blocks: before (blk-1) vs after (blk)
+    apy = {}
+    for key, block_id in (("before", max(0, blk - 1)), ("after", blk)):
+        try:
+            apy[key] = vault_apy_at_block(w3, block_id, morpho_addr=morpho_addr, mids=mids, vault=vault)
+        except Exception:
+            apy[key] = 0.0
+
+    return {
+        "Date (UTC)": date_utc.strftime("%d-%m-%Y %H:%M"),
+        "Tx Hash": tx_hash,
+        "Block": blk,
+        "Gas (ETH)": gas_eth,
+        "Gas (USD)": gas_usd,
+        "APY Before %": apy["before"],
+        "APY After %": apy["after"],
+        "APY Δ (pp)": apy["after"] - apy["before"],  # percentage points
+    }
+
+def collect_reallocations(w3: Web3, vault_cfg: dict, on_progress=None) -> int:
+    """
+    Store the allocator execs of one configured vault (src.app_config.VAULTS
+    entry) not stored yet, from the last stored block on (inclusive, so a run
+    interrupted between two execs of one block picks up the second); returns
+    how many were added.
+    Each row is persisted as soon as it is built, so an interrupted run
+    resumes where it stopped. Runs single-flight per vault (src.single_flight).
+    """
+    vault_addr = checksum(vault_cfg["address"])
+    return single_flight(
+        flight_key("reallocations", vault_addr),
+        lambda progress: _collect_reallocations(w3, vault_cfg, vault_addr, progress), on_progress,
+    )
+
+def _collect_reallocations(w3: Web3, vault_cfg: dict, vault_addr: str, on_progress) -> int:
+    mids = [HexBytes(mid).hex() for mid in vault_cfg.get("market_ids", [])]
+    last = last_reallocation_block(vault_addr)
+    stored = {h.lower() for h in load_reallocations(vault_addr, since_block=last)["Tx Hash"]} if last else set()
+    txs = [
+        t for t in allocator_execs(
+            fetch_txs_to_all_pages(checksum(vault_cfg["roles_modifier"])),
+            vault_cfg["allocator_eoa"], vault_cfg["roles_modifier"],
+            from_block=last,
+        )
+        if str(t.get("hash", "")).lower() not in stored
+    ]
+    for i, t in enumerate(txs):
+        row = reallocation_row(w3, t, vault=vault_addr, morpho_addr=checksum(vault_cfg["morpho_address"]), mids=mids)
+        add_reallocation(vault_addr, row)  # tx hash is the primary key: re-runs are no-ops
+        if on_progress:
+            on_progress(i + 1, len(txs), t["hash"])
+    if txs:
+        export_reallocations_csv(vault_addr)
+    return len(txs)
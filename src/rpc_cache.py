@@ -0,0 +1,234 @@
+# src/rpc_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from web3.middleware import Web3Middleware
+
+RPC_CACHE_PATH = os.path.join("data", "cache", "rpc.sqlite")
+# How often the finalized head is re-read (only ever on a cache miss).
+FINALIZED_TTL = 60
+# Fallback when the node does not know the "finalized" tag.
+FALLBACK_CONFIRMATIONS = 64
+
+# Methods whose answer is fixed once the block they point at is final.
+# value: index of the block parameter in params (None = decided from the result)
+BLOCK_PARAM = {
+    "eth_call": 1,
+    "eth_getBalance": 1,
+    "eth_getCode": 1,
+    "eth_getStorageAt": 2,
+    "eth_getBlockByNumber": 0,
+}
+BY_RESULT = ("eth_getTransactionReceipt", "eth_getTransactionByHash", "eth_getBlockByHash")
+
+def _as_block(x) -> Optional[int]:
+    """Block number from an int or 0x-hex param; None for tags like 'latest'."""
+    if isinstance(x, int):
+        return x
+    if isinstance(x, str) and x.startswith("0x"):
+        try:
+            return int(x, 16)
+        except ValueError:
+            return None
+    return None
+
+def _jsonable(x):
+    if isinstance(x, (bytes, bytearray)):
+        return "0x" + bytes(x).hex()
+    if hasattr(x, "items"):
+        return dict(x)
+    return str(x)
+
+def cache_key(chain_id: int, method: str, params: Any) -> str:
+    payload = json.dumps([chain_id, method, params], sort_keys=True, default=_jsonable, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _chain_id_of(response) -> int:
+    if not (isinstance(response, dict) and response.get("result")):
+        raise RuntimeError(f"eth_chainId failed: {response.get('error') if isinstance(response, dict) else response}")
+    return int(response["result"], 16)
+
+class RPCCache:
+    """
+    Content-addressed store of JSON-RPC results: sha256(chain id, method, params) -> result.
+
+    Backed by one SQLite file in WAL mode so Streamlit sessions and collector
+    processes can share it. Only answers about finalized blocks are stored, so
+    an entry never goes stale and is never revalidated.
+    """
+
+    def __init__(self, path: str = RPC_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._finalized = None
+        self._finalized_at = 0.0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rpc_cache ("
+                "key TEXT PRIMARY KEY, method TEXT NOT NULL, result TEXT NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._db().execute("SELECT result FROM rpc_cache WHERE key = ?", (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, key: str, method: str, result) -> None:
+        data = json.dumps(result, default=_jsonable, separators=(",", ":"))
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR IGNORE INTO rpc_cache (key, method, result) VALUES (?, ?, ?)", (key, method, data))
+            db.commit()
+
+    def _finalized_stale(self) -> bool:
+        return self._finalized is None or time.time() - self._finalized_at > FINALIZED_TTL
+
+    def _set_finalized(self, finalized_resp, latest_resp=None) -> None:
+        blk = finalized_resp.get("result") if isinstance(finalized_resp, dict) else None
+        if blk:
+            self._finalized = int(blk["number"], 16)
+        else:
+            self._finalized = int(latest_resp["result"], 16) - FALLBACK_CONFIRMATIONS
+        self._finalized_at = time.time()
+
+    def finalized_block(self, make_request) -> int:
+        if self._finalized_stale():
+            resp = make_request("eth_getBlockByNumber", ["finalized", False])
+            if not (isinstance(resp, dict) and resp.get("result")):
+                self._set_finalized(resp, make_request("eth_blockNumber", []))
+            else:
+                self._set_finalized(resp)
+        return self._finalized
+
+    async def async_finalized_block(self, make_request) -> int:
+        if self._finalized_stale():
+            resp = await make_request("eth_getBlockByNumber", ["finalized", False])
+            if not (isinstance(resp, dict) and resp.get("result")):
+                self._set_finalized(resp, await make_request("eth_blockNumber", []))
+            else:
+                self._set_finalized(resp)
+        return self._finalized
+
+def pinned_block(method: str, params, result) -> Optional[int]:
+    """Block the answer to (method, params) is pinned to, or None if it can change."""
+    if result is None:
+        return None
+    if method in BLOCK_PARAM:
+        i = BLOCK_PARAM[method]
+        return _as_block(params[i]) if len(params) > i else None
+    if method == "eth_getLogs":
+        flt = params[0] if params else {}
+        if _as_block(flt.get("fromBlock")) is None:
+            return None
+        return _as_block(flt.get("toBlock"))
+    if method in BY_RESULT and isinstance(result, dict):
+        return _as_block(result.get("blockNumber") or result.get("number"))
+    return None
+
+_STORES = {}
+
+def get_store(path: str = RPC_CACHE_PATH) -> RPCCache:
+    return _STORES.setdefault(path, RPCCache(path))
+
+def _cached_response(result) -> dict:
+    return {"jsonrpc": "2.0", "id": 0, "result": result}
+
+class RPCCacheMiddleware(Web3Middleware):
+    """
+    Serves finalized-block requests from the shared RPCCache.
+
+    Inject it as the innermost layer so it sees raw provider responses:
+        w3.middleware_onion.inject(RPCCacheMiddleware, name="rpc_cache", layer=0)
+    Requests against latest/pending or non-final blocks always go to the node.
+    Keys include the chain id, asked once per Web3 instance and never cached,
+    so pointing the provider at another network never serves its answers.
+    """
+
+    store_path = RPC_CACHE_PATH
+    _chain_id: Optional[int] = None
+
+    def _sync_chain_id(self, make_request) -> int:
+        if self._chain_id is None:
+            self._chain_id = _chain_id_of(make_request("eth_chainId", []))
+        return self._chain_id
+
+    async def _async_chain_id(self, make_request) -> int:
+        if self._chain_id is None:
+            self._chain_id = _chain_id_of(await make_request("eth_chainId", []))
+        return self._chain_id
+
+    def wrap_make_request(self, make_request):
+        store = get_store(self.store_path)
+
+        def middleware(method, params):
+            if method == "eth_chainId":
+                return make_request(method, params)
+            key = cache_key(self._sync_chain_id(make_request), method, params)
+            hit = store.get(key)
+            if hit is not None:
+                return _cached_response(hit)
+            response = make_request(method, params)
+            block = None if "error" in response else pinned_block(method, params, response.get("result"))
+            if block is not None and block <= store.finalized_block(make_request):
+                store.put(key, method, response["result"])
+            return response
+
+        return middleware
+
+    def wrap_make_batch_request(self, make_batch_request):
+        store = get_store(self.store_path)
+
+        def middleware(requests_info):
+            chain_id = self._sync_chain_id(self._w3.provider.make_request)
+            keys = [cache_key(chain_id, m, p) for m, p in requests_info]
+            out = [store.get(k) for k in keys]
+            missing = [i for i, hit in enumerate(out) if hit is None]
+            if not missing:
+                return [_cached_response(hit) for hit in out]
+
+            response = make_batch_request([requests_info[i] for i in missing])
+            if not isinstance(response, list):
+                return response  # batch-level error
+            merged = [_cached_response(hit) if hit is not None else None for hit in out]
+            for i, resp in zip(missing, response):
+                merged[i] = resp
+                method, params = requests_info[i]
+                block = None if "error" in resp else pinned_block(method, params, resp.get("result"))
+                # the finalized head lookup goes out as a plain (non-batched) request
+                if block is not None and block <= store.finalized_block(self._w3.provider.make_request):
+                    store.put(keys[i], method, resp["result"])
+            return merged
+
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        store = get_store(self.store_path)
+
+        async def middleware(method, params):
+            if method == "eth_chainId":
+                return await make_request(method, params)
+            key = cache_key(await self._async_chain_id(make_request), method, params)
+            hit = store.get(key)
+            if hit is not None:
+                return _cached_response(hit)
+            response = await make_request(method, params)
+            block = None if "error" in response else pinned_block(method, params, response.get("result"))
+            if block is not None and block <= await store.async_finalized_block(make_request):
+                store.put(key, method, response["result"])
+            return response
+
+        return middleware
@@ -0,0 +1,283 @@
+# src/rpc_pool.py
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Optional, Sequence, Union
+
+import aiohttp
+import requests
+from web3._utils.batching import sort_batch_response_by_response_ids
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.providers.base import JSONBaseProvider
+
+# Latency samples kept per endpoint (p50 for routing, p95 for the hedge delay).
+LATENCY_WINDOW = 200
+# Recent outcomes kept per endpoint for the error rate.
+OUTCOME_WINDOW = 50
+# Consecutive failures before an endpoint is ejected, and for how long.
+EJECT_AFTER = 3
+EJECT_SECONDS = 60
+# Hedge delay bounds (seconds) and the default before any latency is known.
+HEDGE_MIN = 0.05
+HEDGE_DEFAULT = 1.0
+
+# JSON-RPC error codes providers use for throttling / capacity problems.
+THROTTLE_CODES = (-32005, -32029, -32090, 429)
+
+class EndpointError(Exception):
+    """The endpoint failed or throttled us; the request should go elsewhere."""
+
+    def __init__(self, message: str, raw: Optional[bytes] = None):
+        super().__init__(message)
+        self.raw = raw
+
+class Endpoint:
+    def __init__(self, uri: str):
+        self.uri = uri
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.outcomes = deque(maxlen=OUTCOME_WINDOW)
+        self.failures = 0
+        self.ejected_until = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.uri})"
+
+    def _quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self) -> float:
+        p95 = self._quantile(0.95)
+        return HEDGE_DEFAULT if p95 is None else max(HEDGE_MIN, p95)
+
+    def error_rate(self) -> float:
+        with self._lock:
+            return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+    def score(self):
+        """Lower is better: error rate first, then median latency."""
+        p50 = self._quantile(0.5)
+        return (round(self.error_rate(), 1), HEDGE_DEFAULT if p50 is None else p50)
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def record(self, ok: bool, elapsed: Optional[float] = None) -> None:
+        with self._lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.failures = 0
+                if elapsed is not None:
+                    self.latencies.append(elapsed)
+            else:
+                self.failures += 1
+                if self.failures >= EJECT_AFTER:
+                    self.ejected_until = time.time() + EJECT_SECONDS
+                    self.failures = 0
+
+def _ranked(endpoints: List[Endpoint]) -> List[Endpoint]:
+    """Available endpoints, healthiest first (all of them by comeback time if every one is ejected)."""
+    now = time.time()
+    healthy = sorted((e for e in endpoints if e.available(now)), key=Endpoint.score)
+    if healthy:
+        return healthy
+    return sorted(endpoints, key=lambda e: e.ejected_until)
+
+def _check(ep: Endpoint, status: int, raw: bytes) -> bytes:
+    """raw if it is a usable answer; EndpointError for HTTP 429 / 5xx and throttling RPC errors."""
+    if status == 429 or status >= 500:
+        raise EndpointError(f"{ep.uri} answered HTTP {status}")
+    if b'"error"' in raw and _throttled(raw):
+        raise EndpointError(f"{ep.uri} is throttling requests", raw)
+    return raw
+
+def _no_answer(last_error: Exception) -> bytes:
+    if isinstance(last_error, EndpointError) and last_error.raw is not None:
+        return last_error.raw  # every endpoint throttled: let web3 raise the RPC error
+    raise last_error
+
+class RPCPoolProvider(JSONBaseProvider):
+    """
+    JSON-RPC provider over several HTTP endpoints.
+
+    Requests go to the healthiest endpoint (lowest error rate, then median
+    latency). If it has not answered after its p95 latency, a hedged duplicate
+    goes to the next endpoint and the first good answer wins. Failures and
+    throttling responses fail over to the next endpoint. Endpoints that keep
+    failing are ejected for EJECT_SECONDS.
+    """
+
+    def __init__(self, endpoint_uris: List[str], session: Optional[requests.Session] = None,
+                 timeout: float = 30, max_workers: int = 16, **kwargs):
+        super().__init__(**kwargs)
+        if not endpoint_uris:
+            raise ValueError("RPCPoolProvider needs at least one endpoint")
+        self.endpoints = [Endpoint(u) for u in endpoint_uris]
+        self.endpoint_uri = self.endpoints[0].uri
+        self.timeout = timeout
+        self._session = session or requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rpc-pool")
+
+    def __str__(self) -> str:
+        return f"RPC pool {[e.uri for e in self.endpoints]}"
+
+    def ranked(self) -> List[Endpoint]:
+        return _ranked(self.endpoints)
+
+    def _post(self, ep: Endpoint, data: bytes) -> bytes:
+        t0 = time.monotonic()
+        try:
+            resp = self._session.post(
+                ep.uri, data=data, timeout=self.timeout,
+                headers={"Content-Type": "application/json"},
+            )
+            raw = _check(ep, resp.status_code, resp.content)
+            resp.raise_for_status()
+        except Exception:
+            ep.record(False)
+            raise
+        ep.record(True, time.monotonic() - t0)
+        return raw
+
+    def _send(self, data: bytes, hedge: bool = True) -> bytes:
+        queue = self.ranked()
+        first = queue.pop(0)
+        pending = {self._executor.submit(self._post, first, data): first}
+
+        if hedge and queue:
+            done, _ = wait(pending, timeout=first.hedge_delay())
+            if not done:
+                ep = queue.pop(0)
+                pending[self._executor.submit(self._post, ep, data)] = ep
+
+        last_error = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                pending.pop(fut)
+                try:
+                    return fut.result()
+                except Exception as e:
+                    last_error = e
+                    if queue:
+                        ep = queue.pop(0)
+                        pending[self._executor.submit(self._post, ep, data)] = ep
+        return _no_answer(last_error)
+
+    def make_request(self, method, params):
+        data = self.encode_rpc_request(method, params)
+        # never duplicate anything that changes state
+        raw = self._send(data, hedge=not str(method).startswith("eth_send"))
+        return self.decode_rpc_response(raw)
+
+    def make_batch_request(self, batch_requests):
+        data = self.encode_batch_rpc_request(batch_requests)
+        hedge = not any(str(m).startswith("eth_send") for m, _ in batch_requests)
+        response = self.decode_rpc_response(self._send(data, hedge=hedge))
+        if not isinstance(response, list):
+            # RPC errors return only one response with the error object
+            return response
+        return sort_batch_response_by_response_ids(response)
+
+class AsyncRPCPoolProvider(AsyncJSONBaseProvider):
+    """
+    Async counterpart of RPCPoolProvider, for AsyncWeb3: same routing,
+    hedging, failover and ejection, with asyncio tasks instead of threads.
+    Pass a sync pool's endpoints to share their health and latency stats.
+    The aiohttp session is bound to the event loop of the first request;
+    disconnect() closes it.
+    """
+
+    def __init__(self, endpoints: Sequence[Union[str, Endpoint]], timeout: float = 30, **kwargs):
+        super().__init__(**kwargs)
+        if not endpoints:
+            raise ValueError("AsyncRPCPoolProvider needs at least one endpoint")
+        self.endpoints = [e if isinstance(e, Endpoint) else Endpoint(e) for e in endpoints]
+        self.endpoint_uri = self.endpoints[0].uri
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def __str__(self) -> str:
+        return f"async RPC pool {[e.uri for e in self.endpoints]}"
+
+    async def _post(self, ep: Endpoint, data: bytes) -> bytes:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        t0 = time.monotonic()
+        try:
+            async with self._session.post(ep.uri, data=data, headers={"Content-Type": "application/json"}) as resp:
+                raw = _check(ep, resp.status, await resp.read())
+                resp.raise_for_status()
+        except Exception:
+            ep.record(False)
+            raise
+        ep.record(True, time.monotonic() - t0)
+        return raw
+
+    async def _send(self, data: bytes, hedge: bool = True) -> bytes:
+        queue = _ranked(self.endpoints)
+        first = queue.pop(0)
+        pending = {asyncio.ensure_future(self._post(first, data))}
+
+        if hedge and queue:
+            done, _ = await asyncio.wait(pending, timeout=first.hedge_delay())
+            if not done:
+                pending.add(asyncio.ensure_future(self._post(queue.pop(0), data)))
+
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for fut in done:
+                    try:
+                        return fut.result()
+                    except Exception as e:
+                        last_error = e
+                        if queue:
+                            pending.add(asyncio.ensure_future(self._post(queue.pop(0), data)))
+        finally:
+            for fut in pending:  # the losing hedge
+                fut.cancel()
+        return _no_answer(last_error)
+
+    async def make_request(self, method, params):
+        data = self.encode_rpc_request(method, params)
+        raw = await self._send(data, hedge=not str(method).startswith("eth_send"))
+        return self.decode_rpc_response(raw)
+
+    async def make_batch_request(self, batch_requests):
+        data = self.encode_batch_rpc_request(batch_requests)
+        hedge = not any(str(m).startswith("eth_send") for m, _ in batch_requests)
+        response = self.decode_rpc_response(await self._send(data, hedge=hedge))
+        if not isinstance(response, list):
+            return response
+        return sort_batch_response_by_response_ids(response)
+
+    async def disconnect(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+def _throttled(raw: bytes) -> bool:
+    try:
+        body = json.loads(raw)
+    except ValueError:
+        return False
+    for item in body if isinstance(body, list) else [body]:
+        err = item.get("error") if isinstance(item, dict) else None
+        if not isinstance(err, dict):
+            continue
+        msg = str(err.get("message", "")).lower()
+        if "rate limit" in msg or "too many requests" in msg:
+            return True
+        # -32005 also means "query returns too many results": that is not the endpoint's fault
+        if err.get("code") in THROTTLE_CODES and "result" not in msg and "range" not in msg:
+            return True
+    return False
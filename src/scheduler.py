@@ -0,0 +1,154 @@
+# src/scheduler.py
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import pytz
+
+from src.backfill import TZ
+from src.chain import _env_int
+from src.collect import snapshot_at
+
+STATE_PATH = os.path.join("data", "collector_state.json")
+
+# Scheduler tuning (all optional):
+# SCHEDULER_DELAY_SECONDS=300   -> run the daily collection this long after SNAPSHOT_LOCAL_TIME
+# SCHEDULER_RETRY_SECONDS=900   -> wait before retrying a failed run
+# SCHEDULER_MAX_SLEEP=300       -> re-check the clock at least this often (suspend / clock changes)
+SCHEDULER_DELAY_SECONDS = _env_int("SCHEDULER_DELAY_SECONDS", 300)
+SCHEDULER_RETRY_SECONDS = _env_int("SCHEDULER_RETRY_SECONDS", 900)
+SCHEDULER_MAX_SLEEP = _env_int("SCHEDULER_MAX_SLEEP", 300)
+
+def _utcnow() -> datetime:
+    return datetime.now(pytz.UTC)
+
+class Task:
+    """
+    A named collection run. Daily tasks serve one slot per local day, at the
+    snapshot time plus `delay` (under a day); interval tasks run every
+    `every` seconds.
+    run(slot_day) gets the day of the slot being served (None for interval tasks).
+    """
+
+    def __init__(self, name: str, run: Callable[[Optional[date]], None], every: Optional[int] = None,
+                 delay: int = SCHEDULER_DELAY_SECONDS):
+        self.name = name
+        self.run = run
+        self.every = every
+        self.delay = delay
+
+    def _at(self, d: date) -> datetime:
+        return snapshot_at(d) + timedelta(seconds=self.delay)
+
+    def slot(self, now: datetime) -> Optional[datetime]:
+        """Daily tasks: the latest slot at or before now (None for interval tasks)."""
+        if self.every:
+            return None
+        d = now.astimezone(TZ).date()
+        at = self._at(d)
+        return at if at <= now else self._at(d - timedelta(days=1))
+
+    def next_slot(self, now: datetime) -> datetime:
+        d = now.astimezone(TZ).date()
+        at = self._at(d)
+        return at if at > now else self._at(d + timedelta(days=1))
+
+    def slot_day(self, slot: datetime) -> date:
+        return (slot - timedelta(seconds=self.delay)).astimezone(TZ).date()
+
+class Scheduler:
+    """
+    Runs tasks when they are due and remembers, in a JSON state file, the
+    last slot each task completed, so a restart after downtime catches up
+    at once (one run covers every missed day, since collection resumes
+    after the last stored row) instead of waiting for the next slot.
+
+    All times are kept in UTC and every slot is derived from the local
+    calendar day, so DST switches neither skip nor repeat a run.
+    """
+
+    def __init__(self, tasks: List[Task], state_path: str = STATE_PATH,
+                 retry: int = SCHEDULER_RETRY_SECONDS, max_sleep: int = SCHEDULER_MAX_SLEEP):
+        self.tasks = tasks
+        self.state_path = state_path
+        self.retry = retry
+        self.max_sleep = max_sleep
+        self.stop_event = threading.Event()
+        self.state: Dict[str, dict] = self._load()
+
+    # ---- state ----
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.state_path)
+
+    def _time(self, task: Task, key: str) -> Optional[datetime]:
+        raw = self.state.get(task.name, {}).get(key)
+        try:
+            return datetime.fromisoformat(raw) if raw else None
+        except ValueError:
+            return None
+
+    # ---- schedule ----
+    def next_due(self, task: Task, now: datetime) -> datetime:
+        """When the task should run next (now or earlier if it is due)."""
+        done = self._time(task, "done")
+        failed = self._time(task, "failed")
+        if task.every:
+            due = done + timedelta(seconds=task.every) if done else now
+        else:
+            slot = task.slot(now)
+            due = slot if done is None or done < slot else task.next_slot(now)
+        if failed and (done is None or failed > done):
+            due = max(due, failed + timedelta(seconds=self.retry))
+        return due
+
+    def run_task(self, task: Task, now: datetime) -> bool:
+        """Run one task; records the served slot (or the failure) in the state file."""
+        slot = task.slot(now)
+        entry = self.state.setdefault(task.name, {})
+        entry["started"] = now.isoformat()
+        try:
+            task.run(None if slot is None else task.slot_day(slot))
+        except Exception as e:
+            entry["failed"] = now.isoformat()
+            entry["error"] = f"{type(e).__name__}: {e}"
+            self._save()
+            return False
+        entry["done"] = (slot or now).isoformat()
+        entry.pop("error", None)
+        self._save()
+        return True
+
+    def run_pending(self, now: Optional[datetime] = None) -> List[str]:
+        """Run every task that is due; returns their names."""
+        now = now or _utcnow()
+        ran = []
+        for task in self.tasks:
+            if self.next_due(task, now) <= now:
+                self.run_task(task, now)
+                ran.append(task.name)
+        return ran
+
+    def run_forever(self) -> None:
+        """Loop until stop() (e.g. from a signal handler), sleeping until the next due task."""
+        while not self.stop_event.is_set():
+            self.run_pending()
+            now = _utcnow()
+            wake = min(self.next_due(t, now) for t in self.tasks) if self.tasks else now + timedelta(seconds=self.max_sleep)
+            # short, bounded sleeps: wall-clock jumps and suspends are noticed on the next wake-up
+            self.stop_event.wait(min(max((wake - now).total_seconds(), 1.0), self.max_sleep))
+
+    def stop(self) -> None:
+        self.stop_event.set()
@@ -0,0 +1,233 @@
+# src/single_flight.py
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+
+try:
+    import fcntl  # POSIX; elsewhere only the in-process registry applies
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+LOCK_DIR = os.path.join("data", "locks")
+# How often a process waiting on another one's lock re-checks it (seconds)
+POLL_SECONDS = 0.5
+# Progress is published to other processes at most this often (seconds)
+PUBLISH_SECONDS = 0.5
+
+T = TypeVar("T")
+Progress = Optional[Callable[[int, int, str], None]]
+
+class _Flight:
+    """One running job: its latest progress and, once done, its outcome."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.last: Optional[tuple] = None  # (n, total, label)
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+_FLIGHTS: Dict[str, _Flight] = {}
+_FLIGHTS_LOCK = threading.Lock()
+
+def _safe(fn: Progress, *args) -> None:
+    """A progress callback that fails (e.g. a closed Streamlit session) must not break the job."""
+    if fn is None:
+        return
+    try:
+        fn(*args)
+    except Exception:
+        pass
+
+def _follow(get, done: Callable[[], bool], on_progress: Progress) -> None:
+    """
+    Poll get() for progress until done(), reporting changes to on_progress in
+    the caller's own thread (Streamlit elements only work from their session's thread).
+    """
+    seen = None
+    while not done():
+        cur = get()
+        if cur is not None and cur != seen:
+            seen = cur
+            _safe(on_progress, *cur)
+        time.sleep(POLL_SECONDS)
+
+def _path(key: str, ext: str) -> str:
+    return os.path.join(LOCK_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", key) + ext)
+
+def _published(key: str) -> Optional[dict]:
+    try:
+        with open(_path(key, ".json")) as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def progress_of(key: str) -> Optional[dict]:
+    """{"n", "total", "label", "pid"} of the job running under key in any process, or None."""
+    flight = _FLIGHTS.get(key)
+    if flight is not None and flight.last:
+        n, total, label = flight.last
+        return {"n": n, "total": total, "label": label, "pid": os.getpid()}
+    return _published(key)
+
+class _FileLock:
+    """Exclusive flock on data/locks/<key>.lock; released by the OS if the holder dies."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.fd = None
+
+    def try_acquire(self) -> bool:
+        if fcntl is None:
+            return True
+        os.makedirs(LOCK_DIR, exist_ok=True)
+        fd = os.open(_path(self.key, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self) -> None:
+        if self.fd is not None:
+            try:
+                os.remove(_path(self.key, ".json"))
+            except OSError:
+                pass
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+def _publisher(key: str, flight: _Flight, on_progress: Progress) -> Callable[[int, int, str], None]:
+    """Progress callback for the leader: its own callback, the in-process flight and data/locks/<key>.json."""
+    state = {"at": 0.0}
+
+    def report(n: int, total: int, label: str) -> None:
+        flight.last = (n, total, label)
+        _safe(on_progress, n, total, label)
+        now = time.monotonic()
+        if now - state["at"] >= PUBLISH_SECONDS or n >= total:
+            state["at"] = now
+            try:
+                tmp = _path(key, f".{threading.get_ident()}.tmp")
+                with open(tmp, "w") as f:
+                    json.dump({"n": n, "total": total, "label": str(label), "pid": os.getpid()}, f)
+                os.replace(tmp, _path(key, ".json"))
+            except Exception:
+                pass
+    return report
+
+def single_flight(key: str, fn: Callable[[Progress], T], on_progress: Progress = None) -> T:
+    """
+    Run fn(progress) for key unless it is already running, in which case
+    wait for that run instead.
+
+    Within a process (all Streamlit sessions share one), callers that find
+    a running flight follow its progress and get its result (or its
+    exception). Across processes (pages, collector, daemon) an flock on
+    data/locks/<key>.lock lets one run at a time; a process waiting on it
+    sees the holder's progress and, once it is released, runs fn itself,
+    which finds the data collected and has little left to do.
+    """
+    with _FLIGHTS_LOCK:
+        flight = _FLIGHTS.get(key)
+        leader = flight is None
+        if leader:
+            flight = _FLIGHTS[key] = _Flight()
+    if not leader:
+        _follow(lambda: flight.last, flight.done.is_set, on_progress)
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    lock = _FileLock(key)
+    try:
+        if not lock.try_acquire():
+            def other():
+                p = _published(key)
+                return None if not p else (int(p["n"]), int(p["total"]), f"{p['label']} (another process)")
+            _follow(other, lock.try_acquire, on_progress)
+        try:
+            flight.result = fn(_publisher(key, flight, on_progress))
+        finally:
+            lock.release()
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _FLIGHTS_LOCK:
+            _FLIGHTS.pop(key, None)
+        flight.done.set()
+
+# ---- background jobs (pages) ----
+_JOBS: Dict[str, dict] = {}
+_JOBS_LOCK = threading.Lock()
+
+def _locked(key: str) -> bool:
+    """Whether any process (this one included) holds data/locks/<key>.lock right now."""
+    if fcntl is None:
+        return False
+    try:
+        fd = os.open(_path(key, ".lock"), os.O_RDWR)
+    except OSError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return True
+    finally:
+        os.close(fd)  # closing drops the lock if we got it
+    return False
+
+def run_in_background(key: str, fn: Callable[[], object], min_interval: float = 0.0) -> bool:
+    """
+    Start fn() on a daemon thread that outlives the calling script run,
+    unless a job for key is already running in this process or finished less
+    than min_interval seconds ago. fn should itself go through
+    single_flight(key, ...), so its progress shows up in job_state(key).
+    Returns whether a job was started.
+    """
+    with _JOBS_LOCK:
+        job = _JOBS.get(key)
+        if job is not None:
+            if job["thread"].is_alive():
+                return False
+            if job["finished"] and time.time() - job["finished"] < min_interval:
+                return False
+        job = {"thread": None, "result": None, "error": None, "finished": None}
+
+        def run():
+            try:
+                job["result"] = fn()
+            except Exception as e:
+                job["error"] = f"{type(e).__name__}: {e}"
+            finally:
+                job["finished"] = time.time()
+
+        job["thread"] = threading.Thread(target=run, daemon=True, name=f"job-{key}")
+        _JOBS[key] = job
+        job["thread"].start()
+    return True
+
+def job_state(key: str) -> dict:
+    """
+    {"running", "progress", "result", "error", "finished"} for key: running
+    is true while this process's background job or any process's flight for
+    key is active; progress as in progress_of; the rest from the last
+    background job in this process (None if there was none).
+    """
+    job = _JOBS.get(key) or {}
+    thread = job.get("thread")
+    running = bool(thread is not None and thread.is_alive()) or key in _FLIGHTS or _locked(key)
+    return {
+        "running": running,
+        "progress": progress_of(key) if running else None,
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "finished": job.get("finished"),
+    }
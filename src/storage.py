@@ -1,8 +1,15 @@
+import glob
 import os
+import sqlite3
+import threading
+from collections import OrderedDict
 from decimal import Decimal
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 
+from src.analytics import SUMMARY_COLUMNS, share_prices
+
 DATA_DIR = "data"
 
 COLUMNS = [
@@ -17,30 +24,410 @@ COLUMNS = [
     "markets",
     "deposits",
     "withdraws",
+    "total_assets_raw",
+    "total_supply_raw",
+    "asset_decimals",
+    "vault_decimals",
 ]
 
+# uint256 totals do not fit int64/float64 exactly, so they are kept as digit strings
+RAW_COLUMNS = {"total_assets_raw": str, "total_supply_raw": str}
+
+# Reallocation rows: SQL column -> column name shown by the pages (and in the CSV export)
+REALLOC_COLUMNS = {
+    "date_utc": "Date (UTC)",
+    "tx_hash": "Tx Hash",
+    "block": "Block",
+    "gas_eth": "Gas (ETH)",
+    "gas_usd": "Gas (USD)",
+    "apy_before": "APY Before %",
+    "apy_after": "APY After %",
+    "apy_diff": "APY Δ (pp)",
+}
+
+COMPARISON_COLUMNS = ["date", "vault_name", "vault_address", "underlying_token", "daily_apy_pct"]
+
+# Storage (all optional):
+# STORAGE_DB=data/vaultage.db -> SQLite database holding every dataset (WAL mode)
+# STORAGE_CSV_EXPORT=1        -> keep the legacy CSV files in data/ updated after writes (0 to disable)
+# STORAGE_CACHE_MB=256        -> memory budget of the shared read cache (0 disables it)
+def _db_path() -> str:
+    return os.getenv("STORAGE_DB", "").strip() or os.path.join(DATA_DIR, "vaultage.db")
+
+def _csv_export_enabled() -> bool:
+    return os.getenv("STORAGE_CSV_EXPORT", "1").strip().lower() not in ("0", "false", "no", "off")
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS vault_daily (
+    vault            TEXT NOT NULL,  -- lowercase address
+    date             TEXT NOT NULL,  -- YYYY-MM-DD (local day)
+    total_assets     REAL,
+    share_price      REAL,
+    fee_amount       REAL,
+    apy              REAL,
+    yield_earned     REAL,
+    asset_symbol     TEXT,
+    vault_address    TEXT,
+    markets          TEXT,
+    deposits         REAL,
+    withdraws        REAL,
+    total_assets_raw TEXT,
+    total_supply_raw TEXT,
+    asset_decimals   INTEGER,
+    vault_decimals   INTEGER,
+    PRIMARY KEY (vault, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS vault_daily_date ON vault_daily (date);
+
+CREATE TABLE IF NOT EXISTS reallocations (
+    tx_hash    TEXT PRIMARY KEY,
+    vault      TEXT NOT NULL,
+    block      INTEGER NOT NULL,
+    date_utc   TEXT,             -- DD-MM-YYYY HH:MM
+    gas_eth    REAL,
+    gas_usd    REAL,
+    apy_before REAL,
+    apy_after  REAL,
+    apy_diff   REAL
+);
+CREATE INDEX IF NOT EXISTS reallocations_vault_block ON reallocations (vault, block);
+
+CREATE TABLE IF NOT EXISTS apy_comparisons (
+    vault            TEXT NOT NULL,
+    date             TEXT NOT NULL,
+    vault_name       TEXT,
+    vault_address    TEXT,
+    underlying_token TEXT,
+    daily_apy_pct    REAL,
+    PRIMARY KEY (vault, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS apy_comparisons_date ON apy_comparisons (date);
+
+CREATE TABLE IF NOT EXISTS imported_files (path TEXT PRIMARY KEY);
+
+-- Per-vault running totals for the overview, kept up to date by the writers below
+CREATE TABLE IF NOT EXISTS vault_summary (
+    vault             TEXT PRIMARY KEY,
+    first_date        TEXT,   -- first day with a share price
+    first_share_price REAL,
+    last_date         TEXT,   -- last day with a share price
+    last_share_price  REAL,
+    latest_date       TEXT,   -- latest stored day
+    total_assets      REAL,   -- ... and its values
+    share_price       REAL,
+    asset_symbol      TEXT,
+    total_yield       REAL NOT NULL DEFAULT 0,
+    tx_count          INTEGER NOT NULL DEFAULT 0,  -- reallocations
+    gas_eth           REAL NOT NULL DEFAULT 0,
+    gas_usd           REAL NOT NULL DEFAULT 0
+);
+"""
+
+# PRAGMA user_version of a database whose vault_summary rows are complete
+# (2: total_yield is the sum of the stored yield_earned)
+_SCHEMA_VERSION = 2
+
+_LOCAL = threading.local()
+_MIGRATE_LOCK = threading.Lock()
+_MIGRATED = set()  # database paths whose schema / legacy import / summaries this process has set up
+_EXPORTS = set()
+_EXPORTS_LOCK = threading.Lock()
+
+def connect() -> sqlite3.Connection:
+    """
+    This thread's connection to the storage database. WAL lets any number of
+    readers (Streamlit sessions) run while one writer (a backfill or the
+    collector) commits; writers wait up to 30 s for each other.
+    """
+    path = _db_path()
+    if not hasattr(_LOCAL, "conns"):
+        _LOCAL.conns = {}
+    conn = _LOCAL.conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _migrate(conn, path)
+        _LOCAL.conns[path] = conn
+    return conn
+
+def _migrate(conn: sqlite3.Connection, path: str) -> None:
+    """Create the schema, import legacy files and fill summaries: once per process and database."""
+    if path in _MIGRATED:
+        return
+    with _MIGRATE_LOCK:
+        if path in _MIGRATED:
+            return
+        conn.executescript(_DDL)
+        _import_legacy_files(conn)
+        _build_summaries(conn)
+        _MIGRATED.add(path)
+
+# ---- shared read cache ----
+# Parsed query results, shared by every session and thread of the process.
+# An entry is valid while the database and its WAL file keep the (mtime,
+# size) they had when it was read, so commits from any process (collector,
+# daemon) invalidate it; writers in this process also drop entries right
+# away. Least recently used entries go first once the budget is exceeded.
+_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (stamp, df, nbytes)
+_CACHE_LOCK = threading.Lock()
+_CACHE_BYTES = 0
+
+def _cache_budget() -> int:
+    try:
+        return int(float(os.getenv("STORAGE_CACHE_MB", "256")) * 2 ** 20)
+    except ValueError:
+        return 256 * 2 ** 20
+
+def _db_stamp(path: str) -> tuple:
+    out = []
+    for p in (path, path + "-wal"):
+        try:
+            st = os.stat(p)
+            out.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+def _evict(key: tuple) -> None:
+    global _CACHE_BYTES
+    entry = _CACHE.pop(key, None)
+    if entry is not None:
+        _CACHE_BYTES -= entry[2]
+
+def invalidate_cache(table: Optional[str] = None, vault_address: Optional[str] = None) -> None:
+    """Drop cached reads of `table` (all tables if None), only those of one vault if given."""
+    vault = vault_address.lower() if vault_address else None
+    with _CACHE_LOCK:
+        for key in list(_CACHE):
+            _, sql, params = key
+            if (table is None or table in sql) and (vault is None or vault in params):
+                _evict(key)
+
+# Numeric columns of every table: float64 even when a result holds only NULLs
+_FLOAT_COLUMNS = {
+    "total_assets", "share_price", "fee_amount", "apy", "yield_earned", "deposits", "withdraws",
+    "asset_decimals", "vault_decimals", "gas_eth", "gas_usd", "apy_before", "apy_after", "apy_diff",
+    "daily_apy_pct", "first_share_price", "last_share_price", "total_yield",
+}
+
+def _read(sql: str, conn: sqlite3.Connection, params: tuple) -> pd.DataFrame:
+    df = pd.read_sql_query(sql, conn, params=list(params))
+    for c in df.columns:
+        if c in _FLOAT_COLUMNS and df[c].dtype != "float64":
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")
+    return df
+
+def _query(sql: str, params: Iterable = ()) -> pd.DataFrame:
+    """
+    Query results with normalized dtypes, through the shared cache. Returns
+    a shallow copy: callers may add, drop or reassign whole columns, but
+    must not write into existing values (df.loc[...] = x, inplace=True),
+    which would change the cached frame every other session reads.
+    """
+    global _CACHE_BYTES
+    conn = connect()
+    params = tuple(params)
+    budget = _cache_budget()
+    if budget <= 0:
+        return _read(sql, conn, params)
+
+    path = _db_path()
+    key = (path, sql, params)
+    stamp = _db_stamp(path)
+    with _CACHE_LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None and hit[0] == stamp:
+            _CACHE.move_to_end(key)
+            return hit[1].copy(deep=False)
+
+    df = _read(sql, conn, params)
+    nbytes = int(df.memory_usage(index=True, deep=True).sum())
+    with _CACHE_LOCK:
+        _evict(key)
+        if nbytes <= budget:
+            _CACHE[key] = (stamp, df, nbytes)
+            _CACHE_BYTES += nbytes
+        while _CACHE_BYTES > budget and _CACHE:
+            _evict(next(iter(_CACHE)))
+    return df.copy(deep=False)
+
+def _export_async(fn, *args) -> None:
+    """Refresh a legacy CSV export off the caller's thread (never fails the write that triggered it)."""
+    if not _csv_export_enabled():
+        return
+    def run():
+        try:
+            fn(*args)
+        except Exception:
+            pass
+        finally:
+            with _EXPORTS_LOCK:
+                _EXPORTS.discard(t)
+    t = threading.Thread(target=run, daemon=True)
+    with _EXPORTS_LOCK:
+        _EXPORTS.add(t)
+    t.start()
+
+def wait_for_exports(timeout: Optional[float] = None) -> None:
+    """Block until the pending CSV exports are written (call before a short-lived process exits)."""
+    with _EXPORTS_LOCK:
+        pending = list(_EXPORTS)
+    for t in pending:
+        t.join(timeout)
+
+def _write_csv(df: pd.DataFrame, path: str) -> str:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+# ---- legacy files ----
 def _csv_path(vault_address: str) -> str:
     safe = vault_address.lower()
     os.makedirs(DATA_DIR, exist_ok=True)
     return os.path.join(DATA_DIR, f"vault_{safe}.csv")
 
+def _realloc_csv_path(vault_address: str) -> str:
+    return os.path.join(DATA_DIR, f"reallocations_{vault_address.lower()}.csv")
+
+def _comparisons_csv_path() -> str:
+    return os.path.join(DATA_DIR, "apy_comparisons.csv")
+
 def load_csv(vault_address: str) -> pd.DataFrame:
+    """A legacy data/vault_<addr>.csv as COLUMNS (empty if missing)."""
     path = _csv_path(vault_address)
     if os.path.exists(path):
-        df = pd.read_csv(path)
+        df = pd.read_csv(path, dtype=RAW_COLUMNS)
         for c in COLUMNS:
             if c not in df.columns:
                 df[c] = None
         return df[COLUMNS]
     return pd.DataFrame(columns=COLUMNS)
 
-def save_csv(vault_address: str, df: pd.DataFrame):
-    path = _csv_path(vault_address)
-    df.sort_values("date", inplace=True)
-    df.to_csv(path, index=False)
+def _import_legacy_files(conn: sqlite3.Connection) -> None:
+    """
+    One-off migration of the CSV files that predate the database. Each file
+    is imported once per database; rows already in the database win.
+    """
+    done = {r[0] for r in conn.execute("SELECT path FROM imported_files")}
+
+    def claim(path: str) -> bool:
+        if path in done:
+            return False
+        conn.execute("INSERT OR IGNORE INTO imported_files (path) VALUES (?)", (path,))
+        return True
+
+    with conn:
+        for path in sorted(glob.glob(os.path.join(DATA_DIR, "vault_0x*.csv"))):
+            if claim(path):
+                vault = os.path.basename(path)[len("vault_"):-len(".csv")]
+                try:
+                    rows = load_csv(vault).to_dict("records")
+                except Exception:
+                    continue
+                _upsert_vault_rows(conn, vault, rows, replace=False)
+        for path in sorted(glob.glob(os.path.join(DATA_DIR, "reallocations_0x*.csv"))):
+            if claim(path):
+                vault = os.path.basename(path)[len("reallocations_"):-len(".csv")]
+                try:
+                    df = pd.read_csv(path)
+                except Exception:
+                    continue
+                inv = {v: k for k, v in REALLOC_COLUMNS.items()}
+                _insert_reallocations(conn, vault, df.rename(columns=inv).to_dict("records"))
+        path = _comparisons_csv_path()
+        if os.path.exists(path) and claim(path):
+            try:
+                _insert_comparisons(conn, pd.read_csv(path).to_dict("records"))
+            except Exception:
+                pass
+
+def _none(x):
+    """NaN / NA -> None for sqlite parameters."""
+    try:
+        return None if pd.isna(x) else x
+    except (TypeError, ValueError):
+        return x
+
+# ---- daily vault metrics ----
+_VAULT_SQL_COLUMNS = ["vault"] + COLUMNS
+
+def _vault_params(vault: str, row: dict) -> tuple:
+    vals = {c: _none(row.get(c)) for c in COLUMNS}
+    for c in RAW_COLUMNS:
+        if vals[c] is not None and not isinstance(vals[c], str):
+            vals[c] = str(int(vals[c]))
+    for c in ("asset_decimals", "vault_decimals"):
+        if vals[c] is not None:
+            vals[c] = int(vals[c])
+    vals["date"] = str(vals["date"])
+    return (vault.lower(),) + tuple(vals[c] for c in COLUMNS)
 
-def append_or_update_today(
-    df: pd.DataFrame,
+def _upsert_vault_rows(conn: sqlite3.Connection, vault: str, rows: List[dict], replace: bool = True) -> None:
+    cols = ", ".join(_VAULT_SQL_COLUMNS)
+    marks = ", ".join("?" for _ in _VAULT_SQL_COLUMNS)
+    if replace:
+        updates = ", ".join(f"{c} = excluded.{c}" for c in COLUMNS if c != "date")
+        conflict = f"ON CONFLICT (vault, date) DO UPDATE SET {updates}"
+    else:
+        conflict = "ON CONFLICT (vault, date) DO NOTHING"
+    conn.executemany(
+        f"INSERT INTO vault_daily ({cols}) VALUES ({marks}) {conflict}",
+        [_vault_params(vault, r) for r in rows if _none(r.get("date")) is not None],
+    )
+    if replace:
+        _update_vault_summary(conn, vault.lower(), rows)
+    else:  # rows already stored were kept, so fold in what is there now
+        _rebuild_vault_summary(conn, vault.lower())
+
+def load_vault(vault_address: str, columns: Optional[List[str]] = None,
+               since: Optional[str] = None, until: Optional[str] = None) -> pd.DataFrame:
+    """
+    A vault's daily rows, oldest first. columns limits the select to those
+    columns; since / until ("YYYY-MM-DD", inclusive) bound the date range.
+    Raw totals come back as digit strings.
+    """
+    cols = [c for c in (columns or COLUMNS) if c in COLUMNS]
+    sql = f"SELECT {', '.join(cols)} FROM vault_daily WHERE vault = ?"
+    params = [vault_address.lower()]
+    if since:
+        sql += " AND date >= ?"
+        params.append(since)
+    if until:
+        sql += " AND date <= ?"
+        params.append(until)
+    return _query(sql + " ORDER BY date", params)
+
+def vault_date_range(vault_address: str) -> Tuple[Optional[str], Optional[str]]:
+    """(first, last) stored date of a vault, (None, None) without rows; two index lookups."""
+    r = connect().execute(
+        "SELECT (SELECT date FROM vault_daily WHERE vault = ?1 ORDER BY date LIMIT 1), "
+        "(SELECT date FROM vault_daily WHERE vault = ?1 ORDER BY date DESC LIMIT 1)",
+        (vault_address.lower(),),
+    ).fetchone()
+    return r[0], r[1]
+
+def vault_yield_before(vault_address: str, date_str: str) -> float:
+    """Sum of the stored yield_earned of a vault's days before date_str (cumulative yield up to it)."""
+    r = connect().execute(
+        "SELECT COALESCE(SUM(yield_earned), 0) FROM vault_daily WHERE vault = ? AND date < ?",
+        (vault_address.lower(), str(date_str)),
+    ).fetchone()
+    return float(r[0])
+
+def latest_rows(vault_address: str, n: int = 1, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """The vault's last n rows (oldest first)."""
+    cols = list(dict.fromkeys(["date"] + [c for c in (columns or COLUMNS) if c in COLUMNS]))
+    df = _query(
+        f"SELECT {', '.join(cols)} FROM vault_daily WHERE vault = ? ORDER BY date DESC LIMIT ?",
+        [vault_address.lower(), int(n)],
+    )
+    return df.iloc[::-1].reset_index(drop=True)
+
+def _record(
     *,
     date_str: str,
     total_assets: Decimal,
@@ -53,8 +440,13 @@ def append_or_update_today(
     markets: List[str],
     deposits: Decimal,
     withdraws: Decimal,
-) -> pd.DataFrame:
-    row = {
+    total_assets_raw: Optional[int] = None,
+    total_supply_raw: Optional[int] = None,
+    asset_decimals: Optional[int] = None,
+    vault_decimals: Optional[int] = None,
+) -> dict:
+    """One stored row (COLUMNS) from the fields of a backfill row (see VaultAppender.add)."""
+    return {
         "date": date_str,
         "total_assets": float(total_assets),
         "share_price": float(share_price),
@@ -66,17 +458,255 @@ def append_or_update_today(
         "markets": ",".join([m.strip() for m in markets if m.strip()]),
         "deposits": float(deposits),
         "withdraws": float(withdraws),
+        "total_assets_raw": None if total_assets_raw is None else str(total_assets_raw),
+        "total_supply_raw": None if total_supply_raw is None else str(total_supply_raw),
+        "asset_decimals": asset_decimals,
+        "vault_decimals": vault_decimals,
     }
-    if (df["date"] == date_str).any():
-        df.loc[df["date"] == date_str, :] = row
-    else:
-        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-    return df
 
-def latest_date(df: pd.DataFrame) -> Optional[str]:
+class VaultAppender:
+    """
+    Buffers new rows for one vault and upserts them in a single SQLite
+    transaction: a crash leaves either all of them or none. A row for a
+    date that is already stored replaces it.
+
+    Used as a context manager, rows are committed on a clean exit and
+    discarded on an exception.
+
+        with VaultAppender(vault, markets=[...]) as tx:
+            for row in rows:
+                tx.add(**row)
+    """
+
+    def __init__(self, vault_address: str, markets: Optional[List[str]] = None):
+        self.vault_address = vault_address
+        self.markets = markets or []
+        self.rows: List[dict] = []
+
+    def add(self, **fields) -> None:
+        fields.setdefault("vault_address", self.vault_address)
+        fields.setdefault("markets", self.markets)
+        self.rows.append(_record(**fields))
+
+    def commit(self) -> int:
+        """Write the buffered rows; returns how many were written."""
+        n = len(self.rows)
+        if n:
+            conn = connect()
+            with conn:
+                _upsert_vault_rows(conn, self.vault_address, self.rows)
+            self.rows = []
+            invalidate_cache("vault_daily", self.vault_address)
+            invalidate_cache("vault_summary")
+            _export_async(export_vault_csv, self.vault_address)
+        return n
+
+    def __enter__(self) -> "VaultAppender":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rows = []
+
+def export_vault_csv(vault_address: str) -> str:
+    """Write data/vault_<addr>.csv (the pre-database format); returns its path."""
+    out = load_vault(vault_address)
+    for c in ("asset_decimals", "vault_decimals"):
+        out[c] = pd.to_numeric(out[c], errors="coerce").astype("Int16")
+    return _write_csv(out, _csv_path(vault_address))
+
+# ---- per-vault summaries (overview) ----
+_SUMMARY_FIELDS = [
+    "first_date", "first_share_price", "last_date", "last_share_price",
+    "latest_date", "total_assets", "share_price", "asset_symbol", "total_yield",
+]
+
+def _summary_of(df: pd.DataFrame, base: Optional[dict] = None) -> dict:
+    """
+    vault_summary fields for rows df (sorted by date) on top of the summary
+    base of the rows before them. Share prices only depend on their own row
+    and total_yield sums the stored yield_earned (as vault_yield_before
+    does), so this equals summarizing the whole series.
+    """
+    out = {k: (base or {}).get(k) for k in _SUMMARY_FIELDS}
+    sp = share_prices(df)
+    out["total_yield"] = float(out["total_yield"] or 0.0) + float(np.nansum(pd.to_numeric(df["yield_earned"], errors="coerce")))
+    dates = df["date"].astype(str).to_numpy()
+    valid = np.flatnonzero(sp > 0)
+    if len(valid):
+        if out["first_date"] is None:
+            out["first_date"], out["first_share_price"] = dates[valid[0]], float(sp[valid[0]])
+        out["last_date"], out["last_share_price"] = dates[valid[-1]], float(sp[valid[-1]])
+    latest = df.iloc[-1]
+    out["latest_date"] = dates[-1]
+    out["total_assets"] = float(np.nan_to_num(pd.to_numeric(latest.get("total_assets"), errors="coerce")))
+    out["share_price"] = float(np.nan_to_num(sp[-1]))
+    out["asset_symbol"] = _none(latest.get("asset_symbol"))
+    return out
+
+def _store_summary(conn: sqlite3.Connection, vault: str, fields: dict) -> None:
+    cols = ", ".join(_SUMMARY_FIELDS)
+    marks = ", ".join("?" for _ in _SUMMARY_FIELDS)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in _SUMMARY_FIELDS)
+    conn.execute(
+        f"INSERT INTO vault_summary (vault, {cols}) VALUES (?, {marks}) ON CONFLICT (vault) DO UPDATE SET {updates}",
+        (vault,) + tuple(fields.get(c) for c in _SUMMARY_FIELDS),
+    )
+
+def _vault_frame(conn: sqlite3.Connection, sql: str, params: tuple) -> pd.DataFrame:
+    return pd.read_sql_query(f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM vault_daily {sql}", conn, params=list(params))
+
+def _rebuild_vault_summary(conn: sqlite3.Connection, vault: str) -> None:
+    """Recompute a vault's daily-row fields from all its stored rows."""
+    df = _vault_frame(conn, "WHERE vault = ? ORDER BY date", (vault,))
     if df.empty:
-        return None
-    try:
-        return df["date"].max()
-    except Exception:
-        return None
\ No newline at end of file
+        return
+    _store_summary(conn, vault, _summary_of(df))
+
+def _update_vault_summary(conn: sqlite3.Connection, vault: str, rows: List[dict]) -> None:
+    """
+    Fold rows just upserted for vault into its summary. Rows after the
+    latest stored day (the daily append) add to it; anything else (a
+    re-collected range, a legacy import) rebuilds the vault.
+    """
+    df = pd.DataFrame([r for r in rows if _none(r.get("date")) is not None])
+    if df.empty:
+        return
+    df["date"] = df["date"].astype(str)
+    df = df.drop_duplicates(subset="date", keep="last").sort_values("date").reset_index(drop=True)
+    cur = conn.execute(f"SELECT {', '.join(_SUMMARY_FIELDS)} FROM vault_summary WHERE vault = ?", (vault,)).fetchone()
+    base = dict(zip(_SUMMARY_FIELDS, cur)) if cur else None
+    if base is None or base["latest_date"] is None or df["date"].iloc[0] <= base["latest_date"]:
+        _rebuild_vault_summary(conn, vault)
+        return
+    for c in SUMMARY_COLUMNS:
+        if c not in df.columns:
+            df[c] = None
+    _store_summary(conn, vault, _summary_of(df[SUMMARY_COLUMNS], base))
+
+def _build_summaries(conn: sqlite3.Connection) -> None:
+    """Fill vault_summary for a database written before it existed (once)."""
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= _SCHEMA_VERSION:
+        return
+    with conn:
+        conn.execute("DELETE FROM vault_summary")
+        for (vault,) in conn.execute("SELECT DISTINCT vault FROM vault_daily").fetchall():
+            _rebuild_vault_summary(conn, vault)
+        conn.execute(
+            "INSERT INTO vault_summary (vault, tx_count, gas_eth, gas_usd) "
+            "SELECT vault, COUNT(*), COALESCE(SUM(gas_eth), 0), COALESCE(SUM(gas_usd), 0) FROM reallocations GROUP BY vault "
+            "ON CONFLICT (vault) DO UPDATE SET tx_count = excluded.tx_count, gas_eth = excluded.gas_eth, gas_usd = excluded.gas_usd"
+        )
+        conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+def vault_summaries() -> Dict[str, dict]:
+    """
+    {lowercase vault address: summary} for every vault with stored rows or
+    reallocations: first / last day with a share price and those prices,
+    the latest day's total_assets, share_price and asset_symbol,
+    total_yield, and the reallocation tx_count, gas_eth and gas_usd.
+    One small row per vault, however long the histories are.
+    """
+    df = _query("SELECT * FROM vault_summary")
+    return {r["vault"]: r for r in df.to_dict("records")}
+
+# ---- reallocations (allocator EOA execs) ----
+def _insert_reallocations(conn: sqlite3.Connection, vault: str, rows: List[dict]) -> None:
+    cols = list(REALLOC_COLUMNS)
+    vault = vault.lower()
+    sql = (f"INSERT INTO reallocations (vault, {', '.join(cols)}) VALUES (?, {', '.join('?' for _ in cols)}) "
+           "ON CONFLICT (tx_hash) DO NOTHING")
+    added, gas_eth, gas_usd = 0, 0.0, 0.0
+    for r in rows:
+        if not _none(r.get("tx_hash")):
+            continue
+        params = (vault,) + tuple(_none(r.get(c)) for c in cols)
+        if conn.execute(sql, params).rowcount:
+            added += 1
+            gas_eth += float(_none(r.get("gas_eth")) or 0.0)
+            gas_usd += float(_none(r.get("gas_usd")) or 0.0)
+    if added:
+        conn.execute(
+            "INSERT INTO vault_summary (vault, tx_count, gas_eth, gas_usd) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (vault) DO UPDATE SET tx_count = tx_count + excluded.tx_count, "
+            "gas_eth = gas_eth + excluded.gas_eth, gas_usd = gas_usd + excluded.gas_usd",
+            (vault, added, gas_eth, gas_usd),
+        )
+
+def load_reallocations(vault_address: str, since_block: Optional[int] = None) -> pd.DataFrame:
+    """A vault's reallocation rows with the page's column names, oldest block first."""
+    sql = f"SELECT {', '.join(REALLOC_COLUMNS)} FROM reallocations WHERE vault = ?"
+    params = [vault_address.lower()]
+    if since_block is not None:
+        sql += " AND block >= ?"
+        params.append(int(since_block))
+    return _query(sql + " ORDER BY block", params).rename(columns=REALLOC_COLUMNS)
+
+def add_reallocation(vault_address: str, row: dict) -> None:
+    """Insert one reallocation row (page column names); a known Tx Hash is left as is."""
+    inv = {v: k for k, v in REALLOC_COLUMNS.items()}
+    conn = connect()
+    with conn:
+        _insert_reallocations(conn, vault_address, [{inv.get(k, k): v for k, v in row.items()}])
+    invalidate_cache("reallocations", vault_address)
+    invalidate_cache("vault_summary")
+
+def last_reallocation_block(vault_address: str) -> int:
+    r = connect().execute("SELECT MAX(block) FROM reallocations WHERE vault = ?", (vault_address.lower(),)).fetchone()
+    return int(r[0] or 0)
+
+def reallocation_totals(vault_address: str) -> Tuple[int, float, float]:
+    """(tx count, total gas in ETH, total gas in USD) for a vault, from its summary."""
+    r = connect().execute(
+        "SELECT tx_count, gas_eth, gas_usd FROM vault_summary WHERE vault = ?", (vault_address.lower(),),
+    ).fetchone()
+    return (int(r[0]), float(r[1]), float(r[2])) if r else (0, 0.0, 0.0)
+
+def export_reallocations_csv(vault_address: str) -> None:
+    """Refresh data/reallocations_<addr>.csv in the background (if exports are enabled)."""
+    _export_async(lambda: _write_csv(load_reallocations(vault_address), _realloc_csv_path(vault_address)))
+
+# ---- APY comparisons ----
+def _insert_comparisons(conn: sqlite3.Connection, rows: List[dict]) -> int:
+    before = conn.total_changes
+    conn.executemany(
+        "INSERT INTO apy_comparisons (vault, date, vault_name, vault_address, underlying_token, daily_apy_pct) "
+        "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (vault, date) DO NOTHING",
+        [(str(r["vault_address"]).lower(), str(r["date"]), _none(r.get("vault_name")), r["vault_address"],
+          _none(r.get("underlying_token")), _none(r.get("daily_apy_pct")))
+         for r in rows if _none(r.get("vault_address")) and _none(r.get("date"))],
+    )
+    return conn.total_changes - before
+
+def load_comparisons(since: Optional[str] = None, until: Optional[str] = None) -> pd.DataFrame:
+    """Comparison rows (COMPARISON_COLUMNS), optionally bounded by since / until ("YYYY-MM-DD", inclusive)."""
+    sql = f"SELECT {', '.join(COMPARISON_COLUMNS)} FROM apy_comparisons WHERE 1 = 1"
+    params = []
+    if since:
+        sql += " AND date >= ?"
+        params.append(since)
+    if until:
+        sql += " AND date <= ?"
+        params.append(until)
+    return _query(sql + " ORDER BY underlying_token, vault_name, date", params)
+
+def comparison_date_range() -> Tuple[Optional[str], Optional[str]]:
+    """(first, last) date in the comparisons table, (None, None) when empty."""
+    r = connect().execute("SELECT MIN(date), MAX(date) FROM apy_comparisons").fetchone()
+    return r[0], r[1]
+
+def comparison_last_dates() -> Dict[str, str]:
+    """{lowercase vault address: last stored date} for the comparisons table."""
+    return dict(connect().execute("SELECT vault, MAX(date) FROM apy_comparisons GROUP BY vault").fetchall())
+
+def add_comparisons(rows: List[dict]) -> int:
+    """Insert comparison rows; existing (vault, date) rows are kept. Returns the number added."""
+    conn = connect()
+    with conn:
+        n = _insert_comparisons(conn, rows)
+    if n:
+        invalidate_cache("apy_comparisons")
+        _export_async(lambda: _write_csv(load_comparisons(), _comparisons_csv_path()))
+    return n
@@ -1,14 +1,12 @@
 # streamlit_app.py  — Dashboard / Start page (with EOA summaries)
 from datetime import datetime
-from decimal import Decimal, getcontext
-import os
+from decimal import getcontext
 
-import pandas as pd
 import pytz
 import streamlit as st
 
-from src.storage import load_csv
-from src.chain import checksum
+from src.analytics import summary_apy
+from src.storage import vault_summaries
 from src.app_config import START_DATE, SNAPSHOT_LOCAL_TIME, VAULTS
 from src.auth import require_login_on_home, logout_button
 
@@ -100,88 +98,25 @@ def slugify(name: str) -> str:
         .replace(" ", "-")
     )
 
-def _to_dec(x, default=Decimal(0)):
-    try:
-        return Decimal(str(x))
-    except Exception:
-        return default
-
-def _realloc_csv_path(vault_addr_checksum: str) -> str:
-    os.makedirs("data", exist_ok=True)
-    return os.path.join("data", f"reallocations_{vault_addr_checksum.lower()}.csv")
-
-def _load_realloc_csv(vaddr_cs: str) -> pd.DataFrame:
-    path = _realloc_csv_path(vaddr_cs)
-    if os.path.exists(path):
-        try:
-            return pd.read_csv(path)
-        except Exception:
-            return pd.DataFrame()
-    return pd.DataFrame()
-
-def _summary_for_vault(v):
+def _summary_for_vault(v, summaries):
     """Return dict with summary metrics for dashboard cards, incl. EOA summary."""
-    try:
-        addr = checksum(v["address"])
-    except Exception:
-        addr = v["address"]
-
-    df = load_csv(addr)
-    if df.empty:
-        ann_apy_pct = Decimal(0)
-        latest_assets = Decimal(0)
-        asset_symbol = ""
-        latest_sp = Decimal(0)
-        total_yield_cum = Decimal(0)
-    else:
-        df_sorted = df.sort_values("date").reset_index(drop=True)
-        sp_series = pd.to_numeric(df_sorted["share_price"], errors="coerce").dropna()
-        if len(sp_series) >= 2:
-            sp0 = _to_dec(sp_series.iloc[0])
-            spN = _to_dec(sp_series.iloc[-1])
-            d0 = pd.to_datetime(df_sorted["date"].iloc[0]).date()
-            dN = pd.to_datetime(df_sorted["date"].iloc[-1]).date()
-            days = (dN - d0).days
-            if sp0 > 0 and days > 0:
-                ratio = spN / sp0
-                ann_apy = (ratio ** (Decimal(365) / Decimal(days))) - Decimal(1)
-                ann_apy_pct = ann_apy * 100
-            else:
-                ann_apy_pct = Decimal(0)
-        else:
-            ann_apy_pct = Decimal(0)
-
-        latest = df_sorted.iloc[-1]
-        latest_assets = _to_dec(latest["total_assets"])
-        asset_symbol  = latest.get("asset_symbol", "")
-        latest_sp     = _to_dec(latest["share_price"])
-        total_yield_cum = df_sorted["yield_earned"].apply(_to_dec).sum()
-
-    try:
-        vaddr_cs = checksum(v["address"])
-    except Exception:
-        vaddr_cs = v["address"]
-
-    df_r = _load_realloc_csv(vaddr_cs)
-    if df_r.empty:
-        eoa_txs = 0
-        eoa_gas_eth = Decimal(0)
-        eoa_gas_usd = Decimal(0)
-    else:
-        eoa_txs = len(df_r)
-        eoa_gas_eth = _to_dec(pd.to_numeric(df_r["Gas (ETH)"], errors="coerce").fillna(0.0).sum())
-        eoa_gas_usd = _to_dec(pd.to_numeric(df_r["Gas (USD)"], errors="coerce").fillna(0.0).sum())
+    s = summaries.get(v["address"].lower()) or {}
+    ann_apy_pct = summary_apy(s) * 100
+
+    def num(k):
+        x = s.get(k)
+        return 0.0 if x is None or x != x else float(x)
 
     return {
         "name": v["name"],
-        "asset_symbol": asset_symbol,
-        "assets": latest_assets,
-        "sp": latest_sp,
-        "yield": total_yield_cum,
+        "asset_symbol": s.get("asset_symbol") or "",
+        "assets": num("total_assets"),
+        "sp": num("share_price"),
+        "yield": num("total_yield"),
         "ann_apy_pct": ann_apy_pct,
-        "eoa_txs": eoa_txs,
-        "eoa_gas_eth": eoa_gas_eth,
-        "eoa_gas_usd": eoa_gas_usd,
+        "eoa_txs": int(num("tx_count")),
+        "eoa_gas_eth": num("gas_eth"),
+        "eoa_gas_usd": num("gas_usd"),
     }
 
 # ---------- Sidebar: buttons that keep session (no anchor links) ----------
@@ -213,16 +148,17 @@ logout_button()
 
 # ---------- Page header ----------
 st.header("Morpho Vaults — Overview")
-st.caption(f"Start date (per-vault CSV): {START_DATE}. Select a vault from the sidebar or use the buttons below.")
+st.caption(f"Start date (per-vault data): {START_DATE}. Select a vault from the sidebar or use the buttons below.")
 
 # ---------- Summaries grid (incl. EOA summary) ----------
 N = len(VAULTS)
 if N == 0:
     st.info("No vaults configured.")
 else:
+    summaries = vault_summaries()  # one stored row per vault
     cols = st.columns(3)  # 3-up grid
     for i, v in enumerate(VAULTS):
-        s = _summary_for_vault(v)
+        s = _summary_for_vault(v, summaries)
         with cols[i % 3]:
             st.markdown(f"""
             <div class="card">
@@ -247,7 +183,7 @@ else:
                     _goto("pages/2_Reallocations.py", slug)
 
 st.markdown(
-    '<p class="small-note">Overview reads per-vault CSVs in <code>data/</code> and the EOA CSVs '
-    '(e.g. <code>reallocations_&lt;vaultaddr&gt;.csv</code>) to show the latest summaries.</p>',
+    '<p class="small-note">Overview reads the per-vault summaries the collector keeps up to date '
+    'in the local database (<code>data/vaultage.db</code>).</p>',
     unsafe_allow_html=True
 )
\ No newline at end of file
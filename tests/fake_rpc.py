@@ -0,0 +1,77 @@
+# tests/fake_rpc.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HEAD = 1000
+FINALIZED = HEAD - 64
+
+def _block(n: int) -> dict:
+    zero32 = "0x" + "00" * 32
+    return {
+        "number": hex(n), "hash": "0x%064x" % n, "parentHash": "0x%064x" % max(n - 1, 0),
+        "timestamp": hex(1_600_000_000 + 12 * n), "transactions": [], "uncles": [],
+        "difficulty": "0x0", "totalDifficulty": "0x0", "gasLimit": "0x1", "gasUsed": "0x0",
+        "baseFeePerGas": "0x1", "logsBloom": "0x" + "00" * 256, "miner": "0x" + "00" * 20,
+        "extraData": "0x", "nonce": "0x0000000000000000", "size": "0x1", "mixHash": zero32,
+        "sha3Uncles": zero32, "stateRoot": zero32, "transactionsRoot": zero32, "receiptsRoot": zero32,
+    }
+
+class FakeRPC:
+    """
+    Local JSON-RPC endpoint for a chain at block HEAD (finalized: FINALIZED).
+    Every request is recorded in `calls` as (method, params); with `status`
+    set it answers that HTTP status instead.
+    """
+
+    def __init__(self, status: int = 200):
+        self.status = status
+        self.calls = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if fake.status != 200:
+                    fake.calls.extend((r["method"], r.get("params", [])) for r in (body if isinstance(body, list) else [body]))
+                    self.send_response(fake.status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                out = [fake.handle(r) for r in body] if isinstance(body, list) else fake.handle(body)
+                data = json.dumps(out).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def handle(self, req: dict) -> dict:
+        method, params = req["method"], req.get("params", [])
+        self.calls.append((method, params))
+        if method == "eth_chainId":
+            result = "0x1"
+        elif method == "eth_blockNumber":
+            result = hex(HEAD)
+        elif method == "eth_getBlockByNumber":
+            tag = params[0]
+            n = {"latest": HEAD, "finalized": FINALIZED}.get(tag)
+            result = _block(int(tag, 16) if n is None else n)
+        else:
+            return {"jsonrpc": "2.0", "id": req["id"], "error": {"code": -32601, "message": "method not found"}}
+        return {"jsonrpc": "2.0", "id": req["id"], "result": result}
+
+    def count(self, method: str, *params) -> int:
+        """How many requests for method (with these leading params, if given) arrived."""
+        return sum(1 for m, p in self.calls if m == method and list(p[:len(params)]) == list(params))
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,43 @@
+# tests/test_rpc_cache.py
+import os
+import tempfile
+import unittest
+
+from web3 import Web3
+
+from src.rpc_cache import RPCCacheMiddleware
+from tests.fake_rpc import FINALIZED, FakeRPC
+
+class FinalizedOnlyTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.node = FakeRPC()
+        path = os.path.join(self.tmp.name, "rpc.sqlite")
+
+        class Cache(RPCCacheMiddleware):
+            store_path = path
+
+        self.w3 = Web3(Web3.HTTPProvider(self.node.url))
+        self.w3.middleware_onion.inject(Cache, name="rpc_cache", layer=0)
+
+    def tearDown(self):
+        self.node.close()
+        self.tmp.cleanup()
+
+    def _get_block_twice(self, block) -> int:
+        for _ in range(2):
+            self.w3.eth.get_block(block)
+        tag = hex(block) if isinstance(block, int) else block
+        return self.node.count("eth_getBlockByNumber", tag)
+
+    def test_finalized_block_is_served_from_the_cache(self):
+        self.assertEqual(self._get_block_twice(FINALIZED - 10), 1)
+
+    def test_block_past_finalized_is_not_cached(self):
+        self.assertEqual(self._get_block_twice(FINALIZED + 10), 2)
+
+    def test_latest_is_not_cached(self):
+        self.assertEqual(self._get_block_twice("latest"), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+# tests/test_rpc_pool.py
+import asyncio
+import time
+import unittest
+
+from web3 import AsyncWeb3, Web3
+
+from src.rpc_pool import EJECT_AFTER, AsyncRPCPoolProvider, RPCPoolProvider
+from tests.fake_rpc import FakeRPC
+
+class FailoverTest(unittest.TestCase):
+    def setUp(self):
+        self.bad = FakeRPC(status=503)
+        self.good = FakeRPC()
+
+    def tearDown(self):
+        self.bad.close()
+        self.good.close()
+
+    def test_fails_over_to_the_next_endpoint(self):
+        provider = RPCPoolProvider([self.bad.url, self.good.url])
+        w3 = Web3(provider)
+        self.assertEqual(w3.eth.block_number, 1000)
+        self.assertEqual(self.bad.count("eth_blockNumber"), 1)
+        self.assertEqual(self.good.count("eth_blockNumber"), 1)
+        self.assertEqual(provider.endpoints[0].error_rate(), 1.0)
+
+    def test_routes_around_a_failed_endpoint(self):
+        provider = RPCPoolProvider([self.bad.url, self.good.url])
+        w3 = Web3(provider)
+        for _ in range(5):
+            self.assertEqual(w3.eth.block_number, 1000)
+        self.assertEqual(len(self.bad.calls), 1)
+        self.assertEqual(provider.ranked()[0].uri, self.good.url)
+
+    def test_ejects_an_endpoint_that_keeps_failing(self):
+        provider = RPCPoolProvider([self.bad.url])
+        w3 = Web3(provider)
+        for _ in range(EJECT_AFTER):
+            with self.assertRaises(Exception):
+                w3.eth.block_number
+        self.assertFalse(provider.endpoints[0].available(time.time()))
+
+    def test_async_pool_fails_over(self):
+        async def run():
+            aw3 = AsyncWeb3(AsyncRPCPoolProvider([self.bad.url, self.good.url]))
+            try:
+                return await aw3.eth.block_number
+            finally:
+                await aw3.provider.disconnect()
+
+        self.assertEqual(asyncio.run(run()), 1000)
+        self.assertEqual(self.bad.count("eth_blockNumber"), 1)
+        self.assertEqual(self.good.count("eth_blockNumber"), 1)
+
+if __name__ == "__main__":
+    unittest.main()